@@ -1,12 +1,23 @@
 import streamlit as st
-import pandas as pd
 import folium
 from streamlit_folium import st_folium  # Updated import
-import json
 import os
-from PIL import Image
 import plotly.express as px
 
+from dashboard_data import DashboardData
+from dashboard_map import (
+    CLUSTER_LIMIT,
+    CLUSTERS,
+    HEATMAP,
+    MARKER_LIMIT,
+    MARKERS,
+    build_bases_map,
+    choose_map_mode,
+)
+from frame_store_handler import FrameStore
+from results_handler import open_result_store
+from thumbnail_handler import MEDIUM, SMALL, thumbnail_path
+
 # Set page configuration
 st.set_page_config(
     page_title="OSINT Analyzer",
@@ -15,36 +26,94 @@ st.set_page_config(
 )
 
 
-# Function to load data
-@st.cache_data
-def load_data():
-    with open("data.json", "r") as f:
-        data = json.load(f)
-    return data
+# RESULT_STORE picks the backend: a .db file is an indexed SQLite store
+@st.cache_resource
+def get_store():
+    return open_result_store(
+        os.environ.get("RESULT_STORE", "data.jsonl"), read_only=True
+    )
 
 
-# Load the data
-data = load_data()
+# Rebuilt only when the store changes, shared by every session and rerun
+@st.cache_resource(max_entries=1)
+def load_dashboard_data(store_version):
+    return DashboardData(get_store())
 
 
-# Create a DataFrame for the bases
-def create_bases_df(data):
-    bases = []
-    for base_analysis in data:
-        base_info = base_analysis.get("base_info", {})
-        commander_info = base_analysis.get("Commander", {})
+# One map per data version and mode, built without a per-base Python loop
+@st.cache_resource(max_entries=3)
+def load_bases_map(store_version, mode):
+    return build_bases_map(load_dashboard_data(store_version).bases_df, mode)
+
+
+# Filtered pages of the list are indexed queries on a SQLite store
+@st.cache_data(max_entries=64)
+def load_bases_page(
+    store_version, countries, confidence_levels, sort_by, descending, page, page_size
+):
+    return load_dashboard_data(store_version).filter_bases(
+        countries=list(countries),
+        confidence_levels=list(confidence_levels),
+        sort_by=sort_by,
+        descending=descending,
+        limit=page_size,
+        offset=(page - 1) * page_size,
+    )
+
+
+@st.cache_data(max_entries=64)
+def count_bases(store_version, countries, confidence_levels):
+    return load_dashboard_data(store_version).count_bases(
+        countries=list(countries), confidence_levels=list(confidence_levels)
+    )
+
+
+# Only the base shown on the detail page is read from the store
+@st.cache_data(max_entries=32)
+def load_base(store_version, base_id):
+    return get_store().get(base_id)
+
+
+store = get_store()
+store_version = store.version()
+dashboard = load_dashboard_data(store_version)
+
+
+# Opened read-only: a missing store finds no frames and the old paths are used
+@st.cache_resource
+def get_frame_store():
+    return FrameStore(os.environ.get("FRAME_STORE", "./frames"), read_only=True)
+
+
+def resolve_screenshot(report, legacy_path):
+    """Return the stored frame an analyst report references, or its old path."""
+    frame_hash = report.get("frame_hash")
+    if frame_hash:
+        frame_path = get_frame_store().path(frame_hash)
+        if frame_path is not None:
+            return frame_path
+    return legacy_path
+
+
+def show_screenshot(image_path, caption, key):
+    """Show a screenshot's medium preview and the full frame only on request."""
+    preview_path = thumbnail_path(image_path, MEDIUM)
+    if not os.path.exists(preview_path):
+        # Screenshots taken before previews existed, until they are backfilled
+        st.image(image_path, caption=caption, use_container_width=True)
+        return
+    st.image(preview_path, caption=caption, use_container_width=True)
+    if st.toggle("Full resolution", key=key):
+        st.image(image_path, use_container_width=True)
+
 
-        base = {
-            "Country": base_info.get("country", "Unknown"),
-            "Latitude": float(base_info.get("latitude", 0)),
-            "Longitude": float(base_info.get("longitude", 0)),
-            "Confidence Level": commander_info.get("confidence_score", "Unknown"),
-            "Overall Assessment": commander_info.get(
-                "overall_assessment", "No assessment available"
-            ),
-        }
-        bases.append(base)
-    return pd.DataFrame(bases)
+def show_thumbnail(image_path, caption):
+    """Show a screenshot's small preview, if it has one."""
+    preview_path = thumbnail_path(image_path, SMALL)
+    if os.path.exists(preview_path):
+        st.image(preview_path, caption=caption, use_container_width=True)
+    else:
+        st.caption(caption)
 
 
 # Create sidebar for navigation
@@ -66,85 +135,113 @@ if "selected_base" not in st.session_state:
 if st.session_state.page == "home":
     st.title("Military Bases OSINT Analysis Dashboard")
 
-    # Create a DataFrame with bases information
-    bases_df = create_bases_df(data)
-
     # Display metrics
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Total Bases Analyzed", len(data))
+        st.metric("Total Bases Analyzed", len(dashboard))
     with col2:
-        countries = bases_df["Country"].unique()
-        st.metric("Countries Covered", len(countries))
+        st.metric("Countries Covered", len(dashboard.country_counts))
     with col3:
-        high_threat = len(bases_df[bases_df["Confidence Level"] == "High"])
-        st.metric("High Threat Bases", high_threat)
+        st.metric("High Threat Bases", dashboard.confidence_counts.get("High", 0))
 
     # Display map with all bases
     st.subheader("Military Bases Map")
 
-    # Create a base map
-    m = folium.Map(location=[20, 0], zoom_start=2)
-
-    # Add markers for each base
-    for i, base in bases_df.iterrows():
-        confidence_colors = {
-            "High": "red",
-            "Medium": "orange",
-            "Low": "green",
-            "Unknown": "gray",
-        }
-        confidence_level = base["Confidence Level"]
-        color = confidence_colors.get(confidence_level, "blue")
-
-        popup_html = f"""
-        <b>Country:</b> {base['Country']}<br>
-        <b>Confidence Level:</b> {confidence_level}<br>
-        <b>Coordinates:</b> {base['Latitude']:.5f}, {base['Longitude']:.5f}
-        """
-
-        folium.Marker(
-            location=[base["Latitude"], base["Longitude"]],
-            popup=folium.Popup(popup_html, max_width=300),
-            icon=folium.Icon(color=color, icon="info-sign"),
-        ).add_to(m)
-
-    # Display the map
-    st_folium(m)  # Updated function call
+    with st.sidebar.expander("Map settings"):
+        map_mode = st.selectbox(
+            "Map mode", ["Auto", MARKERS, CLUSTERS, HEATMAP], format_func=str.title
+        )
+        marker_limit = st.number_input(
+            "Cluster above (bases)", min_value=0, value=MARKER_LIMIT, step=100
+        )
+        cluster_limit = st.number_input(
+            "Heat map above (bases)", min_value=0, value=CLUSTER_LIMIT, step=1000
+        )
+    if map_mode == "Auto":
+        map_mode = choose_map_mode(len(dashboard), marker_limit, cluster_limit)
+
+    m = load_bases_map(store_version, map_mode)
+
+    # Display the map; map interactions do not need to rerun the page
+    st_folium(m, use_container_width=True, returned_objects=[])
 
     # Display a table of bases
     st.subheader("Military Bases List")
 
+    # Filter and sort the cached table, then render only the current page
+    filter_cols = st.columns([3, 2, 2, 1, 1])
+    with filter_cols[0]:
+        selected_countries = st.multiselect(
+            "Country", sorted(dashboard.country_counts)
+        )
+    with filter_cols[1]:
+        selected_confidence = st.multiselect(
+            "Confidence Level", ["High", "Medium", "Low", "Unknown"]
+        )
+    with filter_cols[2]:
+        sort_by = st.selectbox(
+            "Sort by", ["Country", "Confidence Level", "Latitude", "Longitude"]
+        )
+    with filter_cols[3]:
+        descending = st.checkbox("Descending")
+    with filter_cols[4]:
+        page_size = st.selectbox("Per page", [12, 24, 48])
+
+    countries = tuple(selected_countries)
+    confidence_levels = tuple(selected_confidence)
+    match_count = count_bases(store_version, countries, confidence_levels)
+    page_count = max(1, -(-match_count // page_size))
+    list_state = (countries, confidence_levels, sort_by, descending, page_size)
+    if st.session_state.get("list_state") != list_state:
+        # Different filters, order or page size start over at the first page
+        st.session_state.list_state = list_state
+        st.session_state.list_page = 1
+    st.session_state.list_page = min(st.session_state.list_page, page_count)
+    page = st.number_input(
+        f"Page (of {page_count}, {match_count} bases)",
+        min_value=1,
+        max_value=page_count,
+        key="list_page",
+    )
+    page_bases = load_bases_page(
+        store_version,
+        countries,
+        confidence_levels,
+        sort_by,
+        descending,
+        page,
+        page_size,
+    )
+
     # Display bases in a grid of cards
     cols = st.columns(3)
-    for i, base_analysis in enumerate(data):
-        base_info = base_analysis.get("base_info", {})
-        commander_info = base_analysis.get("Commander", {})
-
+    for i, (base_id, country, latitude, longitude, confidence, _) in enumerate(
+        page_bases.itertuples(index=False)
+    ):
         with cols[i % 3]:
             with st.container():
                 st.markdown(
                     f"""
                 <div style="padding: 15px; border-radius: 5px; border: 1px solid #ddd; margin-bottom: 15px;">
-                    <h3>{base_info.get('country', 'Unknown')} Base</h3>
-                    <p><b>Coordinates:</b> {base_info.get('latitude', 'N/A')}, {base_info.get('longitude', 'N/A')}</p>
-                    <p><b>Confidence Level:</b> {commander_info.get('confidence_score', 'Unknown')}</p>
+                    <h3>{country} Base</h3>
+                    <p><b>Coordinates:</b> {latitude}, {longitude}</p>
+                    <p><b>Confidence Level:</b> {confidence}</p>
                 </div>
                 """,
                     unsafe_allow_html=True,
                 )
 
-                if st.button(f"View Details", key=f"base_{i}"):
+                if st.button(f"View Details", key=f"base_{base_id}"):
                     st.session_state.page = "base_details"
-                    st.session_state.selected_base = i
+                    st.session_state.selected_base = base_id
                     st.rerun()
 
 # Display base details page
 elif st.session_state.page == "base_details":
-    base_index = st.session_state.selected_base
+    base_id = st.session_state.selected_base
+    base_analysis = load_base(store_version, base_id) if base_id is not None else None
 
-    if base_index is not None and base_index < len(data):
-        base_analysis = data[base_index]
+    if base_analysis is not None:
         base_info = base_analysis.get("base_info", {})
         commander_info = base_analysis.get("Commander", {})
 
@@ -179,16 +276,16 @@ elif st.session_state.page == "base_details":
                 st.subheader("Initial Satellite Image (Analyst 1)")
                 country = base_info.get("country", "Unknown")
                 base_id_for_screenshot = f"{lat}_{lon}_{country}"
-                first_analyst_screenshot_path = (
-                    f"screenshots/{base_id_for_screenshot}/analyst_1.jpeg"
+                first_analyst_screenshot_path = resolve_screenshot(
+                    base_analysis.get("Analyst 1", {}),
+                    f"screenshots/{base_id_for_screenshot}/analyst_1.jpeg",
                 )
 
                 if os.path.exists(first_analyst_screenshot_path):
-                    image = Image.open(first_analyst_screenshot_path)
-                    st.image(
-                        image,
+                    show_screenshot(
+                        first_analyst_screenshot_path,
                         caption="Initial satellite view by Analyst 1",
-                        use_container_width=True,
+                        key="full_analyst_1",
                     )
                 else:
                     st.error(
@@ -340,6 +437,24 @@ elif st.session_state.page == "base_details":
             analysts = [
                 key for key in base_analysis.keys() if key.startswith("Analyst")
             ]
+
+            # Small previews of every analyst's view to pick from
+            base_id_for_screenshot = (
+                f"{base_info.get('latitude', 'N/A')}_"
+                f"{base_info.get('longitude', 'N/A')}_"
+                f"{base_info.get('country', 'Unknown')}"
+            )
+            for column, analyst in zip(st.columns(max(len(analysts), 1)), analysts):
+                with column:
+                    show_thumbnail(
+                        resolve_screenshot(
+                            base_analysis.get(analyst, {}),
+                            f"screenshots/{base_id_for_screenshot}/"
+                            f"analyst_{analyst.split(' ')[-1]}.jpeg",
+                        ),
+                        caption=analyst,
+                    )
+
             selected_analyst = st.selectbox("Select Analyst", analysts)
 
             # Display the selected analyst's report with styled containers
@@ -355,7 +470,10 @@ elif st.session_state.page == "base_details":
                 country = base_info.get("country", "Unknown")
                 base_id_for_screenshot = f"{lat}_{lon}_{country}"
 
-                analyst_screenshot_path = f"screenshots/{base_id_for_screenshot}/analyst_{analyst_number_str}.jpeg"
+                analyst_screenshot_path = resolve_screenshot(
+                    analyst_report,
+                    f"screenshots/{base_id_for_screenshot}/analyst_{analyst_number_str}.jpeg",
+                )
 
                 # Create tabs within the analyst report for better organization
                 findings_tab, analysis_tab, continue_tab, action_tab = st.tabs(
@@ -440,11 +558,10 @@ elif st.session_state.page == "base_details":
 
                     # Display analyst's screenshot
                     if os.path.exists(analyst_screenshot_path):
-                        analyst_image = Image.open(analyst_screenshot_path)
-                        st.image(
-                            analyst_image,
+                        show_screenshot(
+                            analyst_screenshot_path,
                             caption=f"Screenshot by {selected_analyst}",
-                            use_container_width=True,
+                            key=f"full_{selected_analyst}",
                         )
                     else:
                         st.warning(
@@ -1,11 +1,31 @@
+import itertools
 import os
-import json
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
 
 import dotenv
 
-from screenshot_handler import ScreenshotHandler
-from utils_handler import parse_csv
+from screenshot_handler import ScreenshotHandler, ScreenshotHandlerPool
+from imagery_provider import IMAGE_SIZE, MultiResolutionProvider
+from utils_handler import make_base_id, parse_csv
+from results_handler import ResultStore, open_result_store
+from cache_handler import ImageryCache
+from checkpoint_handler import CheckpointStore
+from frame_store_handler import (
+    FrameStore,
+    checkpoint_frames,
+    configure_frame_store,
+    referenced_frames,
+)
+from pipeline_handler import TeamSession, run_pipeline
+from rate_limit_handler import rate_limit_stats
+from response_cache import ResponseCache
+from tracing_handler import configure_tracing, span
+from work_queue_handler import WorkQueue
 from llm_analyst import Analyst
+from llm_clients import close_clients
 from llm_commander import Commander
 
 # Load environment variables from .env file
@@ -18,7 +38,15 @@ if not (GEMINI_KEY or OPENROUTER_KEY):
     raise RuntimeError("A key is missing in the environment variables.")
 
 
-def team_analysis(screenshot_handler, analyst, base, team_size=8):
+def team_analysis(
+    screenshot_handler,
+    analyst,
+    base,
+    team_size=8,
+    make_commander=None,
+    speculative=False,
+    checkpoints=None,
+):
     """
     Conducts a multi-step analysis of a given base using a team of virtual analysts.
 
@@ -29,135 +57,498 @@ def team_analysis(screenshot_handler, analyst, base, team_size=8):
     Finally, a commander synthesizes all analyst reports into a final verdict.
 
     Args:
-        screenshot_handler: An instance of ScreenshotHandler to capture images.
+        screenshot_handler: An ImageryProvider, such as ScreenshotHandler, to
+            capture images.
         analyst: An instance of the Analyst class to perform image analysis.
         base: A dictionary containing base information, including 'latitude',
             'longitude', and 'country'.
         team_size (int, optional): The maximum number of analyst iterations.
                                 Defaults to 8.
+        make_commander (optional): Callable returning a Commander for the
+            collected analyses. Defaults to an OpenRouter Commander.
+        speculative (bool, optional): While each analyst is thinking, capture
+            the likely next views into the imagery cache. Needs a
+            ScreenshotHandler with a cache. Defaults to False.
+        checkpoints (CheckpointStore, optional): Checkpoints every step and
+            resumes the base from its last saved step. Defaults to None.
 
     Returns:
         dict: A dictionary containing all analyses, including individual analyst
             reports and the final commander's verdict.
     """
-    latitude = float(base["latitude"])
-    longitude = float(base["longitude"])
-    base_id = f"{latitude}_{longitude}_{base['country']}"
-    distance_to_ground = 20000
-
-    analyses = {}
-
-    for i in range(team_size):
-        screenshot = screenshot_handler.screenshot(
-            latitude=latitude,
-            longitude=longitude,
-            ground_distance=distance_to_ground,
-            filename=f"{base_id}/analyst_{i+1}",
+    if make_commander is None:
+        make_commander = _make_commander
+
+    session = TeamSession(
+        base=base, analyst=analyst, team_size=team_size, checkpoints=checkpoints
+    )
+
+    speculative = speculative and hasattr(screenshot_handler, "speculating")
+
+    while not session.finished:
+        screenshot = session.capture(screenshot_handler)
+        if speculative:
+            with screenshot_handler.speculating(session.candidate_views()):
+                screenshot_analysis = session.analyze(screenshot)
+        else:
+            screenshot_analysis = session.analyze(screenshot)
+        session.record(screenshot_analysis)
+
+    commander = make_commander(session.analyses)
+    return session.conclude(commander)
+
+
+def _make_analyst(country, response_cache=None):
+    return Analyst(api_key=GEMINI_KEY, country=country, response_cache=response_cache)
+
+
+def _make_commander(analyses, response_cache=None):
+    return Commander(
+        api_key=OPENROUTER_KEY,
+        analyst_results=analyses,
+        response_cache=response_cache,
+    )
+
+
+def _make_multiresolution_provider(
+    provider_factory=None, cache=None, extent_factor=1.5, detail_factor=2.0
+):
+    if provider_factory is not None:
+        provider = provider_factory()
+    else:
+        # The window has to fit the wide master frame in CSS pixels; rendering
+        # at detail_factor device pixels per CSS pixel supplies the extra detail
+        window = round(IMAGE_SIZE * extent_factor) + 200
+        provider = ScreenshotHandler(
+            cache=cache,
+            browser_settings={
+                "window_size": (window, window),
+                "device_scale_factor": detail_factor,
+            },
         )
-        screenshot_analysis = analyst.analyze_image(image=screenshot)
-        analyses[f"Analyst {i+1}"] = screenshot_analysis
-
-        print(f"command:{screenshot_analysis['action']}")
-        match screenshot_analysis["action"]:
-            case "zoom-in":
-                distance_to_ground -= 5000
-            case "zoom-out":
-                distance_to_ground += 5000
-            case "move-left":
-                longitude -= 0.01
-            case "move-right":
-                longitude += 0.01
-            case "finish":
-                break
-            case _:
-                raise RuntimeError(f"Unknown action: {screenshot_analysis.action}")
-
-        analyst.append_results(analyst_index=i, results=screenshot_analysis)
-
-    commander = Commander(api_key=OPENROUTER_KEY, analyst_results=analyses)
-    verdict = commander.analyze()
-    if verdict == "":
-        raise RuntimeError("LLM Analysis Error")
-
-    analyses["Commander"] = json.loads(verdict.strip())
-    return analyses
-
-
-def analyze_bases(csv_path: str = "./military_bases.csv", rows_to_process=8):
-    military_bases = parse_csv(csv_path, rows_to_process)
-    screenshot_handler = ScreenshotHandler()
+    return MultiResolutionProvider(
+        provider, extent_factor=extent_factor, detail_factor=detail_factor
+    )
+
+
+def _start_base(base, make_analyst, checkpoints=None):
+    """
+    Prepares a clean screenshot directory for a base and creates its analyst.
+
+    A base with a checkpoint keeps its screenshots, since the analysis resumes
+    where it stopped.
+
+    Args:
+        base: A dictionary with the base's 'latitude', 'longitude' and 'country'.
+        make_analyst: Callable returning an analyst for a country.
+        checkpoints: The run's CheckpointStore, or None.
+
+    Returns:
+        Analyst: A fresh analyst for the base's country.
+    """
+    base_id = make_base_id(base)
+
+    # create directory if it doesn't exist
+    os.makedirs(f"./screenshots/{base_id}", exist_ok=True)
+    if checkpoints is not None and checkpoints.exists(base_id):
+        print(f"Resuming base: {base_id}")
+        return make_analyst(base["country"])
+
+    # if exist_ok remove all files in the directory
+    for filename in os.listdir(f"./screenshots/{base_id}"):
+        file_path = os.path.join(f"./screenshots/{base_id}", filename)
+        if os.path.isfile(file_path):
+            os.remove(file_path)
+
+    print(f"Analyzing base: {base_id}")
+    analyze_country = base["country"]
+    return make_analyst(analyze_country)
+
+
+def _analyze_base(
+    screenshot_pool,
+    base,
+    make_analyst,
+    make_commander,
+    speculative=False,
+    checkpoints=None,
+):
+    """
+    Runs the full team analysis for a single base on a borrowed browser session.
 
-    # Load existing analyses if the file exists
-    output_file_path = "data.json"
-    existing_analyses = []
-    if os.path.exists(output_file_path):
+    Args:
+        screenshot_pool: A ScreenshotHandlerPool to borrow a browser session from.
+        base: A dictionary with the base's 'latitude', 'longitude' and 'country'.
+        make_analyst: Callable returning an analyst for a country.
+        make_commander: Callable returning a commander for a dict of analyses.
+        speculative: Prefetch likely next views while analysts are thinking.
+        checkpoints: CheckpointStore used to save and resume steps, or None.
+
+    Returns:
+        dict: The team analysis result.
+    """
+    analyst = _start_base(base, make_analyst, checkpoints)
+
+    # Perform analysis
+    with screenshot_pool.acquire() as screenshot_handler:
+        return team_analysis(
+            screenshot_handler=screenshot_handler,
+            analyst=analyst,
+            base=base,
+            make_commander=make_commander,
+            speculative=speculative,
+            checkpoints=checkpoints,
+        )
+
+
+def _run_workers(
+    screenshot_pool,
+    bases,
+    workers,
+    make_analyst,
+    make_commander,
+    speculative=False,
+    checkpoints=None,
+):
+    """
+    Analyzes whole bases on a thread pool, yielding (base, result) pairs.
+
+    At most two bases per worker are submitted at a time. If the caller stops
+    early, e.g. on an error or Ctrl-C, the bases not started yet are cancelled
+    instead of being analyzed and thrown away, and the ones in progress are
+    waited for, so the screenshot pool is not quit while they use it.
+    """
+    bases = iter(bases)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = {}
+
+    def submit(count):
+        for base in itertools.islice(bases, count):
+            future = executor.submit(
+                _analyze_base,
+                screenshot_pool,
+                base,
+                make_analyst,
+                make_commander,
+                speculative,
+                checkpoints,
+            )
+            futures[future] = base
+
+    try:
+        submit(2 * workers)
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                base = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = e
+                yield base, result
+                submit(1)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _run_queue_workers(
+    screenshot_pool,
+    work_queue,
+    workers,
+    make_analyst,
+    make_commander,
+    speculative=False,
+    checkpoints=None,
+):
+    """
+    Analyzes bases claimed from a WorkQueue, yielding (base, result) pairs.
+
+    Each worker claims bases until the queue has none left. The caller
+    completes or releases every claimed base once its result is handled. An
+    error claiming a base is raised to the caller.
+    """
+    results = queue.Queue()
+    stop = threading.Event()
+
+    def work():
+        try:
+            while not stop.is_set() and (base := work_queue.claim()) is not None:
+                try:
+                    result = _analyze_base(
+                        screenshot_pool,
+                        base,
+                        make_analyst,
+                        make_commander,
+                        speculative,
+                        checkpoints,
+                    )
+                except Exception as e:
+                    result = e
+                results.put((base, result))
+        except Exception as e:
+            results.put(e)
+        finally:
+            results.put(None)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in range(workers):
+            executor.submit(work)
+        running = workers
         try:
-            with open(output_file_path, "r") as f:
-                existing_analyses = json.load(f)
-                print(f"Loaded {len(existing_analyses)} existing analyses")
-        except json.JSONDecodeError:
-            print(f"Error loading {output_file_path}, starting with empty analyses")
+            while running:
+                item = results.get()
+                if item is None:
+                    running -= 1
+                    continue
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Claim nothing new if the caller stops early; leases on bases
+            # still in progress expire and are picked up by other workers
+            stop.set()
+
+
+def analyze_bases(
+    csv_path: str = "./military_bases.csv",
+    rows_to_process=8,
+    workers: int = 1,
+    imagery_cache: ImageryCache = None,
+    pipeline: bool = False,
+    analysis_workers: int = 4,
+    provider_factory=None,
+    multiresolution: bool = False,
+    speculative: bool = False,
+    response_cache: ResponseCache = None,
+    make_analyst=None,
+    make_commander=None,
+    result_store: ResultStore = None,
+    checkpoints: CheckpointStore = None,
+    work_queue: WorkQueue = None,
+    frame_store: FrameStore = None,
+    trace_path: str = "./metrics/spans.jsonl",
+):
+    """
+    Analyzes every base in the CSV file that has not been analyzed yet.
 
-    # Create a set of already analyzed base identifiers (latitude_longitude_country)
-    analyzed_bases = {
-        f"{base_data.get('latitude', '')}_{base_data.get('longitude', '')}_{base_data.get('country', '')}"
-        for analysis in existing_analyses
-        for base_data in [analysis.get("base_info", {})]
-    }
+    Bases are processed by `workers` concurrent workers, each borrowing one of
+    `workers` browser sessions. In pipeline mode the browsers and
+    `analysis_workers` LLM workers instead run as separate stages, so frames
+    for other bases are captured while analysis calls are in flight. Each
+    result is appended to the ResultStore journal as soon as its base
+    finishes, so an interrupted run keeps all completed bases. A journal is
+    compacted into data.json once at the end of the run; a SQLite store
+    publishes data.json only when `python results_handler.py` is run.
 
-    base_analyses = existing_analyses.copy()
+    Args:
+        csv_path: Path to the CSV file listing the bases.
+        rows_to_process: Maximum number of CSV rows to read.
+        workers (int, optional): Number of bases analyzed concurrently. Defaults to 1.
+        imagery_cache (ImageryCache, optional): Screenshot cache shared by all
+            browser sessions. Defaults to an ImageryCache in ./cache/imagery.
+        pipeline (bool, optional): Overlap capture and analysis across bases.
+            Defaults to False.
+        analysis_workers (int, optional): Number of concurrent LLM workers in
+            pipeline mode. Defaults to 4.
+        provider_factory (optional): Callable returning a new ImageryProvider
+            per worker, e.g. a LocalRasterProvider for offline runs. Defaults
+            to Chrome-backed ScreenshotHandler sessions.
+        multiresolution (bool, optional): Capture one wide master frame per
+            area and serve zoom/pan views that fit inside it as local crops.
+            Defaults to False.
+        speculative (bool, optional): Capture likely next views in spare tabs
+            while each analyst is thinking. Only used outside pipeline mode,
+            where the browsers are already busy with other bases. Defaults to
+            False.
+        response_cache (ResponseCache, optional): Record/replay cache for the
+            analyst and commander responses. Defaults to None.
+        make_analyst (optional): Callable returning an analyst for a country.
+            Defaults to a Gemini Analyst.
+        make_commander (optional): Callable returning a commander for a dict of
+            analyses. Defaults to an OpenRouter Commander.
+        result_store (ResultStore, optional): Where results are saved, a
+            ResultStore journal or a SQLiteResultStore. Defaults to a
+            ResultStore journal in the working directory.
+        checkpoints (CheckpointStore, optional): Per-step checkpoints, so a
+            base that failed or was interrupted resumes from its last completed
+            step. Defaults to a CheckpointStore in ./checkpoints.
+        work_queue (WorkQueue, optional): Lease table shared with other
+            analyzer processes, possibly on other hosts sharing the working
+            directory. The pending bases are added to it and each worker
+            claims bases from it until none are left. Not supported in
+            pipeline mode. Defaults to None.
+        frame_store (FrameStore, optional): Content-addressed store receiving
+            the captured frames instead of ./screenshots, so each unique frame
+            is stored once. Unreferenced frames are garbage-collected down to
+            its quota at the end of the run. Defaults to None.
+        trace_path (str, optional): JSONL file receiving per-stage timing spans,
+            or None to only print the summary. Set OTEL_TRACING=1 to also
+            export spans through OpenTelemetry.
+    """
+    tracer = configure_tracing(
+        path=trace_path, opentelemetry=os.environ.get("OTEL_TRACING") == "1"
+    )
+    military_bases = parse_csv(csv_path, rows_to_process)
 
-    for base in military_bases:
+    if make_analyst is None:
+        make_analyst = partial(_make_analyst, response_cache=response_cache)
+    if make_commander is None:
+        make_commander = partial(_make_commander, response_cache=response_cache)
+    if result_store is None:
+        result_store = ResultStore()
+    if checkpoints is None:
+        checkpoints = CheckpointStore()
 
+    # Stream the set of already analyzed base identifiers (latitude_longitude_country)
+    analyzed_bases = result_store.analyzed_ids()
+    print(f"Loaded {len(analyzed_bases)} existing analyses")
+
+    pending_bases = []
+    for base in military_bases:
         # Create identifier for current base
-        base_id = f"{base.get('latitude', '')}_{base.get('longitude', '')}_{base.get('country', '')}"
+        base_id = make_base_id(base)
         # Skip if this base has already been analyzed
         if base_id in analyzed_bases:
             print(f"Skipping already analyzed base: {base_id}")
             continue
-        # create directory if it doesn't exist
-        os.makedirs(f"./screenshots/{base_id}", exist_ok=True)
-        # if exist_ok remove all files in the directory
-        for filename in os.listdir(f"./screenshots/{base_id}"):
-            file_path = os.path.join(f"./screenshots/{base_id}", filename)
-            if os.path.isfile(file_path):
-                os.remove(file_path)
-
-        print(f"Analyzing base: {base_id}")
-        analyze_country = base["country"]
-        analyst = Analyst(api_key=GEMINI_KEY, country=analyze_country)
-
-        # Perform analysis
-        analysis_result = team_analysis(
-            screenshot_handler=screenshot_handler, analyst=analyst, base=base
+        analyzed_bases.add(base_id)
+        pending_bases.append(base)
+
+    if work_queue is not None:
+        if pipeline:
+            raise RuntimeError("A work queue cannot be used in pipeline mode")
+        print(f"Queued {work_queue.add(pending_bases)} new bases")
+        counts = work_queue.counts()
+        print(f"Work queue: {counts}")
+        if not counts.get("pending") and not counts.get("leased"):
+            print("No queued bases left to analyze")
+            tracer.close()
+            return
+    elif not pending_bases:
+        print("No new bases to analyze")
+        tracer.close()
+        return
+    else:
+        workers = min(workers, len(pending_bases))
+
+    workers = max(1, workers)
+    if imagery_cache is None:
+        imagery_cache = ImageryCache()
+    if multiresolution:
+        provider_factory = partial(
+            _make_multiresolution_provider, provider_factory, imagery_cache
+        )
+    configure_frame_store(frame_store)
+    screenshot_pool = ScreenshotHandlerPool(
+        size=workers, cache=imagery_cache, provider_factory=provider_factory
+    )
+
+    if pipeline:
+        results = run_pipeline(
+            bases=pending_bases,
+            screenshot_pool=screenshot_pool,
+            make_analyst=partial(
+                _start_base, make_analyst=make_analyst, checkpoints=checkpoints
+            ),
+            make_commander=make_commander,
+            analysis_workers=analysis_workers,
+            checkpoints=checkpoints,
+        )
+    elif work_queue is not None:
+        results = _run_queue_workers(
+            screenshot_pool,
+            work_queue,
+            workers,
+            make_analyst,
+            make_commander,
+            speculative=speculative,
+            checkpoints=checkpoints,
+        )
+    else:
+        results = _run_workers(
+            screenshot_pool,
+            pending_bases,
+            workers,
+            make_analyst,
+            make_commander,
+            speculative=speculative,
+            checkpoints=checkpoints,
         )
 
-        # Add base information to the result for future identification
-        analysis_result["base_info"] = {
-            "latitude": base["latitude"],
-            "longitude": base["longitude"],
-            "country": base["country"],
-        }
-
-        # Add to our analyses list
-        base_analyses.append(analysis_result)
-
-        bases_data = json.dumps(base_analyses, indent=4)
-
-        # Save after each analysis to preserve progress
-        temp_data = json.dumps(base_analyses, indent=4)
-        with open(output_file_path, "w") as f:
-            f.write(temp_data)
-        print(f"Updated analysis data saved to {output_file_path}")
-
-    # Final save (may be redundant but ensures consistency)
-    bases_data = json.dumps(base_analyses, indent=4)
-    with open(output_file_path, "w") as f:
-        f.write(bases_data)
-    print(f"Analysis data saved to {output_file_path}")
-
-    screenshot_handler.quit()
+    try:
+        for base, analysis_result in results:
+            if isinstance(analysis_result, Exception):
+                print(f"Error analyzing base {make_base_id(base)}: {analysis_result}")
+                if work_queue is not None:
+                    work_queue.release(make_base_id(base), error=str(analysis_result))
+                continue
+
+            # Add base information to the result for future identification
+            analysis_result["base_info"] = {
+                "latitude": base["latitude"],
+                "longitude": base["longitude"],
+                "country": base["country"],
+            }
+
+            # Results are collected on this thread only, so saving after
+            # each analysis needs no extra locking
+            with span("store.append", base_id=make_base_id(base)):
+                result_store.append(analysis_result)
+            checkpoints.discard(make_base_id(base))
+            if work_queue is not None:
+                work_queue.complete(make_base_id(base))
+            print(f"Analysis appended to {result_store.path}")
+    finally:
+        screenshot_pool.quit()
+        with span("store.compact"):
+            result_store.compact()
+        print(f"Imagery cache stats: {imagery_cache.stats()}")
+        if multiresolution:
+            for provider in screenshot_pool.handlers:
+                print(f"Multi-resolution stats: {provider.stats()}")
+        if speculative and not pipeline:
+            for handler in screenshot_pool.handlers:
+                handler = getattr(handler, "provider", handler)
+                if hasattr(handler, "prefetch_stats"):
+                    print(f"Speculative prefetch stats: {handler.prefetch_stats()}")
+        if response_cache is not None:
+            print(f"Response cache stats: {response_cache.stats()}")
+        for provider, stats in rate_limit_stats().items():
+            print(f"{provider} rate limiter stats: {stats}")
+        tracer.print_summary()
+        tracer.close()
+        close_clients()
+        if work_queue is not None:
+            print(f"Work queue: {work_queue.counts()}")
+            work_queue.close()
+        if frame_store is not None:
+            print(f"Frame store stats: {frame_store.stats()}")
+            frame_store.gc(
+                referenced_frames(result_store)
+                | checkpoint_frames(checkpoints.directory)
+            )
+            configure_frame_store(None)
 
 
 if __name__ == "__main__":
-    analyze_bases()
+    # RESPONSE_CACHE_MODE=record|replay|passthrough enables the response cache
+    response_cache_mode = os.environ.get("RESPONSE_CACHE_MODE")
+    # WORK_QUEUE=path/to/queue.db splits the bases with other analyzer processes
+    work_queue_path = os.environ.get("WORK_QUEUE")
+    # RESULT_STORE=data.db stores results in an indexed SQLite database
+    result_store_path = os.environ.get("RESULT_STORE", "data.jsonl")
+    # FRAME_STORE=./frames stores each unique frame once, FRAME_CODEC=webp
+    # re-encodes new frames as smaller, lossy WebP
+    frame_store_path = os.environ.get("FRAME_STORE")
+    analyze_bases(
+        response_cache=(
+            ResponseCache(mode=response_cache_mode) if response_cache_mode else None
+        ),
+        work_queue=WorkQueue(work_queue_path) if work_queue_path else None,
+        result_store=open_result_store(result_store_path),
+        frame_store=(
+            FrameStore(frame_store_path, codec=os.environ.get("FRAME_CODEC", "jpeg"))
+            if frame_store_path
+            else None
+        ),
+    )
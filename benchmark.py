@@ -0,0 +1,287 @@
+"""
+End-to-end throughput benchmark for the analysis pipeline.
+
+Drives `analyze_bases` with local stand-ins for every external dependency: a
+synthetic imagery provider instead of Chrome and Google Earth, and scripted
+analyst and commander responses instead of Gemini and OpenRouter. Each scale
+runs in a fresh subprocess inside a temporary directory, so peak RSS and the
+on-disk stores are measured per scale.
+
+Usage:
+    python benchmark.py --scales 10 1000 10000 --workers 4 --pipeline
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import itertools
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# analyze_bases refuses to start without API keys; the stand-ins never use them
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+
+from PIL import Image
+
+from imagery_provider import ImageryProvider
+from results_handler import ResultStore
+
+PERCENTILES = (50, 90, 99)
+
+
+class StageTimer:
+    """Thread-safe collector of per-stage latencies in seconds."""
+
+    def __init__(self):
+        self.latencies = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.latencies.setdefault(stage, []).append(elapsed)
+
+    def percentiles(self) -> dict:
+        report = {}
+        for stage, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            report[stage] = {
+                f"p{p}": samples[min(len(samples) - 1, len(samples) * p // 100)]
+                for p in PERCENTILES
+            }
+            report[stage]["count"] = len(samples)
+        return report
+
+
+def _sleep(latency: float, jitter: float):
+    if latency > 0:
+        time.sleep(max(0.0, random.uniform(latency - jitter, latency + jitter)))
+
+
+class SyntheticImageryProvider(ImageryProvider):
+    """
+    Cycles through noise frames after a simulated load time.
+
+    Consecutive views get different frames, so none is skipped as a duplicate
+    of a view the base's analysts already saw.
+    """
+
+    FRAMES = 16
+
+    def __init__(self, timer: StageTimer, latency: float = 0.0, jitter: float = 0.0):
+        self.timer = timer
+        self.latency = latency
+        self.jitter = jitter
+        self.frames = []
+        for _ in range(self.FRAMES):
+            buffer = io.BytesIO()
+            Image.effect_noise((1024, 1024), 64).convert("RGB").save(buffer, "JPEG")
+            self.frames.append(buffer.getvalue())
+        self._next_frame = itertools.count()
+
+    def screenshot(
+        self,
+        latitude: float,
+        longitude: float,
+        filename: str,
+        ground_distance: int = 0,
+        output_file_path: str = None,
+        image_size: int = 1024,
+    ):
+        with self.timer.time("capture"):
+            _sleep(self.latency, self.jitter)
+            return self.frames[next(self._next_frame) % self.FRAMES]
+
+
+class ScriptedAnalyst:
+    """Plays back a fixed action sequence with a simulated model latency."""
+
+    def __init__(
+        self,
+        timer: StageTimer,
+        actions: list,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+    ):
+        self.timer = timer
+        self.actions = actions
+        self.latency = latency
+        self.jitter = jitter
+        self.step = 0
+
+    def analyze_image(self, image):
+        with self.timer.time("analyst"):
+            _sleep(self.latency, self.jitter)
+            action = self.actions[min(self.step, len(self.actions) - 1)]
+            self.step += 1
+            return {
+                "findings": ["hardened aircraft shelters, N-quadrant"],
+                "analysis": "Scripted benchmark analysis.",
+                "things_to_continue_analyzing": ["revetments, E-quadrant"],
+                "action": action,
+            }
+
+    def append_results(self, analyst_index: int, results: dict):
+        pass
+
+
+class ScriptedCommander:
+    """Returns a fixed verdict with a simulated model latency."""
+
+    VERDICT = json.dumps(
+        {
+            "overall_assessment": "Scripted benchmark verdict.",
+            "key_confirmed_assets": [],
+            "unresolved_items": [],
+            "recommended_actions": [],
+            "confidence_score": "Medium",
+        }
+    )
+
+    def __init__(self, timer: StageTimer, latency: float = 0.0, jitter: float = 0.0):
+        self.timer = timer
+        self.latency = latency
+        self.jitter = jitter
+
+    def analyze(self):
+        with self.timer.time("commander"):
+            _sleep(self.latency, self.jitter)
+            return self.VERDICT
+
+
+class TimedResultStore(ResultStore):
+    """ResultStore that records how long each durable append takes."""
+
+    def __init__(self, timer: StageTimer, **kwargs):
+        super().__init__(**kwargs)
+        self.timer = timer
+
+    def append(self, analysis: dict):
+        with self.timer.time("persist"):
+            super().append(analysis)
+
+
+def _write_bases_csv(path: str, count: int):
+    rng = random.Random(count)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "country", "latitude", "longitude", "google_maps_link"])
+        for i in range(count):
+            latitude = rng.uniform(-60, 60)
+            longitude = rng.uniform(-180, 180)
+            writer.writerow([i, "Benchland", latitude, longitude, ""])
+
+
+def run_scale(args) -> dict:
+    """Runs one benchmark scale in the current process and returns its report."""
+    from base_analyzer import analyze_bases
+
+    timer = StageTimer()
+    actions = args.actions.split(",")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        _write_bases_csv("bases.csv", args.bases)
+
+        start = time.perf_counter()
+        # analyze_bases logs every step; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            analyze_bases(
+                csv_path="bases.csv",
+                rows_to_process=args.bases,
+                workers=args.workers,
+                pipeline=args.pipeline,
+                analysis_workers=args.analysis_workers,
+                provider_factory=lambda: SyntheticImageryProvider(
+                    timer, args.capture_latency, args.jitter
+                ),
+                make_analyst=lambda country: ScriptedAnalyst(
+                    timer, actions, args.analyst_latency, args.jitter
+                ),
+                make_commander=lambda analyses: ScriptedCommander(
+                    timer, args.commander_latency, args.jitter
+                ),
+                result_store=TimedResultStore(timer),
+            )
+        elapsed = time.perf_counter() - start
+
+    return {
+        "bases": args.bases,
+        "seconds": elapsed,
+        "bases_per_minute": args.bases / elapsed * 60 if elapsed else 0.0,
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "stages": timer.percentiles(),
+    }
+
+
+def _print_report(report: dict):
+    print(
+        f"\n{report['bases']} bases: {report['seconds']:.2f}s, "
+        f"{report['bases_per_minute']:.1f} bases/min, "
+        f"peak RSS {report['peak_rss_mb']:.1f} MB"
+    )
+    for stage, stats in report["stages"].items():
+        latencies = ", ".join(
+            f"p{p} {stats[f'p{p}'] * 1000:.2f}ms" for p in PERCENTILES
+        )
+        print(f"  {stage:<10} n={stats['count']:<7} {latencies}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--bases", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--pipeline", action="store_true")
+    parser.add_argument("--analysis-workers", type=int, default=4)
+    parser.add_argument("--actions", default="zoom-in,move-left,move-right,finish")
+    parser.add_argument("--capture-latency", type=float, default=0.0)
+    parser.add_argument("--analyst-latency", type=float, default=0.0)
+    parser.add_argument("--commander-latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--json", action="store_true", help="Print raw JSON reports")
+    args = parser.parse_args()
+
+    if args.bases is not None:
+        # Child process: run a single scale and hand the report back as JSON
+        print(json.dumps(run_scale(args)))
+        return
+
+    script = os.path.abspath(__file__)
+    child_args = [a for a in sys.argv[1:] if a != "--json"]
+    reports = []
+    for scale in args.scales:
+        output = subprocess.run(
+            [sys.executable, script, *child_args, "--bases", str(scale)],
+            cwd=os.path.dirname(script),
+            env={**os.environ, "PYTHONPATH": os.path.dirname(script)},
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+        reports.append(report)
+        if not args.json:
+            _print_report(report)
+
+    if args.json:
+        print(json.dumps(reports, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+import itertools
+import os
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from selenium import webdriver
+from selenium.webdriver import ChromeOptions
+from selenium.webdriver.chrome.service import Service
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Each concurrent Chrome needs its own profile directory; slots are handed out
+# in order so a restarted run reuses the same warm profiles. The counter is only
+# used where fcntl is unavailable to lock the slots across processes
+_profile_slots = itertools.count()
+_profile_slots_lock = threading.Lock()
+
+
+def _claim_profile_dir(profile_root: str):
+    """
+    Reserve the first profile directory no other browser is using.
+
+    Slots are locked with flock on a `session_{slot}.lock` file, so browsers in
+    other processes, or on other hosts sharing the directory, never share a
+    profile. Without fcntl the slots are only unique within this process.
+
+    Args:
+        profile_root: Directory holding the profile directories
+
+    Returns:
+        tuple: The profile directory and the open lock file, which holds the
+            slot until it is closed
+    """
+    os.makedirs(profile_root, exist_ok=True)
+    if fcntl is None:
+        with _profile_slots_lock:
+            slot = next(_profile_slots)
+        return os.path.join(profile_root, f"session_{slot}"), None
+
+    for slot in itertools.count():
+        profile_dir = os.path.join(profile_root, f"session_{slot}")
+        lock_file = open(f"{profile_dir}.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            continue
+        return profile_dir, lock_file
+
+
+def chrome_options(
+    headless: bool = True,
+    window_size: tuple = (1600, 1200),
+    profile_dir: str = None,
+    disk_cache_mb: int = 1024,
+    device_scale_factor: float = None,
+) -> ChromeOptions:
+    """
+    Build Chrome options tuned for unattended Google Earth captures.
+
+    Args:
+        headless: Run Chrome without a visible window
+        window_size: Fixed (width, height) of the browser window in pixels
+        profile_dir: Persistent profile directory, so map tiles stay in the
+            disk cache between sessions and runs
+        disk_cache_mb: Size of the profile's HTTP disk cache in megabytes
+        device_scale_factor: Device pixels per CSS pixel, to render the page
+            at a finer resolution than the window size alone gives
+
+    Returns:
+        ChromeOptions: The launch options
+    """
+    options = ChromeOptions()
+    if headless:
+        options.add_argument("--headless=new")
+    # Render WebGL in software so no GPU is needed
+    options.add_argument("--use-angle=swiftshader")
+    options.add_argument("--enable-unsafe-swiftshader")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--hide-scrollbars")
+    options.add_argument("--mute-audio")
+    options.add_argument(f"--window-size={window_size[0]},{window_size[1]}")
+    if device_scale_factor is not None:
+        options.add_argument(f"--force-device-scale-factor={device_scale_factor}")
+    if profile_dir is not None:
+        profile_dir = os.path.abspath(profile_dir)
+        options.add_argument(f"--user-data-dir={profile_dir}")
+        cache_dir = os.path.join(profile_dir, "cache")
+        options.add_argument(f"--disk-cache-dir={cache_dir}")
+        options.add_argument(f"--disk-cache-size={disk_cache_mb * 1024 * 1024}")
+    return options
+
+
+class BrowserManager:
+    """
+    Owns one Chrome session and keeps it healthy over long runs.
+
+    The session is recycled after `max_captures` captures or once Chrome's
+    memory use passes `max_memory_mb` (measured with psutil when installed).
+    `watchdog` kills a session that does not finish a navigation within
+    `navigation_timeout` seconds; the caller then restarts it and retries, so
+    a wedged page costs one capture instead of the whole run. On POSIX,
+    chromedriver runs in its own process group, so killing the group also
+    kills every Chrome process it started. A restart reuses the profile
+    directory only once all of them have exited, and otherwise moves to a
+    fresh profile slot.
+
+    Attributes:
+        captures: Captures taken by the current session.
+        restarts: Number of times the session has been replaced.
+    """
+
+    def __init__(
+        self,
+        options=None,
+        headless: bool = True,
+        window_size: tuple = (1600, 1200),
+        device_scale_factor: float = None,
+        profile_root: str = "./cache/chrome-profiles",
+        max_captures: int = 200,
+        max_memory_mb: int = 3072,
+        navigation_timeout: float = 90,
+    ):
+        self._profile_lock = None
+        self._stale_profile_locks = []
+        self._profile_settings = None
+        if options is None:
+            self._profile_settings = {
+                "headless": headless,
+                "window_size": window_size,
+                "device_scale_factor": device_scale_factor,
+                "profile_root": profile_root,
+            }
+            options = self._profile_options()
+
+        self.options = options
+        self.max_captures = max_captures
+        self.max_memory_mb = max_memory_mb
+        self.navigation_timeout = navigation_timeout
+        self.captures = 0
+        self.restarts = 0
+        self.driver = None
+        self._killed = threading.Event()
+
+        self.start()
+
+    def _profile_options(self) -> ChromeOptions:
+        """Claim a profile slot and build the options that use it."""
+        settings = dict(self._profile_settings)
+        profile_dir, self._profile_lock = _claim_profile_dir(
+            settings.pop("profile_root")
+        )
+        return chrome_options(profile_dir=profile_dir, **settings)
+
+    def start(self):
+        """Launch a fresh Chrome session."""
+        service = Service()
+        if os.name == "posix":
+            service = Service(popen_kw={"start_new_session": True})
+        self.driver = webdriver.Chrome(options=self.options, service=service)
+        self.driver.set_page_load_timeout(self.navigation_timeout)
+        self.captures = 0
+        self._killed.clear()
+
+    def restart(self, reason: str):
+        """Replace the current Chrome session with a fresh one."""
+        print(f"Restarting browser: {reason}")
+        if not self._close() and self._profile_settings is not None:
+            # A surviving Chrome still holds the profile; keep its slot locked
+            # so nobody else starts on it, and move to another one
+            print("Browser processes did not exit, switching to a new profile")
+            self._stale_profile_locks.append(self._profile_lock)
+            self.options = self._profile_options()
+        self.restarts += 1
+        self.start()
+
+    @property
+    def killed(self) -> bool:
+        """Whether the watchdog killed the current session."""
+        return self._killed.is_set()
+
+    @contextmanager
+    def watchdog(self, timeout: float = None):
+        """
+        Kill the browser if the enclosed block runs past its deadline.
+
+        A killed session makes the blocked WebDriver call fail, so the caller
+        regains control and can `restart` the browser.
+        """
+        timer = threading.Timer(
+            self.navigation_timeout if timeout is None else timeout, self._kill
+        )
+        timer.daemon = True
+        timer.start()
+        try:
+            yield
+        finally:
+            timer.cancel()
+
+    def _kill(self):
+        print("Browser watchdog deadline exceeded, killing session")
+        self._killed.set()
+        self._terminate()
+
+    def _terminate(self):
+        process = self.driver.service.process if self.driver else None
+        if process is None:
+            return
+        if psutil is not None:
+            try:
+                for child in psutil.Process(process.pid).children(recursive=True):
+                    child.kill()
+            except psutil.NoSuchProcess:
+                pass
+        _kill_process_group(process)
+        process.kill()
+
+    def memory_mb(self):
+        """Resident memory of chromedriver and all Chrome processes, if known."""
+        if psutil is None or self.driver is None:
+            return None
+        try:
+            root = psutil.Process(self.driver.service.process.pid)
+            processes = [root, *root.children(recursive=True)]
+        except psutil.NoSuchProcess:
+            return None
+
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.NoSuchProcess:
+                continue
+        return total / (1024 * 1024)
+
+    def record_capture(self):
+        """Count a capture and recycle the session when it is due."""
+        self.captures += 1
+        if self.captures >= self.max_captures:
+            self.restart(f"recycling after {self.captures} captures")
+            return
+
+        memory = self.memory_mb()
+        if memory is not None and memory > self.max_memory_mb:
+            self.restart(f"recycling at {memory:.0f} MB")
+
+    def _close(self) -> bool:
+        """
+        Close the browser, killing it if it no longer responds.
+
+        Returns:
+            bool: Whether every process of the session is known to have exited
+        """
+        if self.driver is None:
+            return True
+        process = self.driver.service.process
+        try:
+            self.driver.quit()
+        except Exception:
+            self._terminate()
+        self.driver = None
+        return _session_exited(process)
+
+    def quit(self):
+        """Close the browser and give its profile directory back."""
+        exited = self._close()
+        locks = self._stale_profile_locks
+        if exited:
+            locks = [*locks, self._profile_lock]
+        for lock in locks:
+            if lock is not None:
+                lock.close()
+        self._stale_profile_locks = []
+        self._profile_lock = None
+
+
+def _kill_process_group(process):
+    """Kill chromedriver's process group, taking every Chrome process with it."""
+    if os.name != "posix":
+        return
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _session_exited(process, timeout: float = 10) -> bool:
+    """
+    Wait for chromedriver and the Chrome processes it started to exit.
+
+    Processes still running after half the timeout are killed.
+
+    Returns:
+        bool: True once none is left, False if that cannot be confirmed
+    """
+    if process is None:
+        return True
+    if _wait_for_exit(process, timeout / 2):
+        return True
+    _kill_process_group(process)
+    process.kill()
+    return _wait_for_exit(process, timeout / 2)
+
+
+def _wait_for_exit(process, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        return False
+    if os.name != "posix":
+        return True
+    # Chrome's processes outlive chromedriver until they notice it is gone
+    while _group_alive(process.pid):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.1)
+    return True
+
+
+def _group_alive(process_group: int) -> bool:
+    try:
+        os.killpg(process_group, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    if psutil is None:
+        return True
+    # Zombies hold no profile lock, they only wait to be reaped
+    for process in psutil.process_iter(["status"]):
+        try:
+            if (
+                os.getpgid(process.pid) == process_group
+                and process.info["status"] != psutil.STATUS_ZOMBIE
+            ):
+                return True
+        except (ProcessLookupError, psutil.NoSuchProcess):
+            continue
+    return False
@@ -0,0 +1,177 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+class ImageryCache:
+    """
+    On-disk screenshot cache keyed by quantized camera position.
+
+    Coordinates are rounded to `coordinate_precision` decimal places and the
+    ground distance to a multiple of `distance_step` meters, so views that
+    differ only by floating point drift (e.g. move-left followed by move-right)
+    map to the same entry. Frames other than the standard size, such as the
+    master frames of the multi-resolution mode, are keyed by their size too.
+    Entries are stored under the SHA-256 of that key and evicted
+    least-recently-used once the cache exceeds `max_bytes`.
+
+    Attributes:
+        directory: Folder holding the cached JPEG files.
+        max_bytes: Size bound for the whole cache.
+        hits: Number of lookups served from the cache.
+        misses: Number of lookups that required a browser capture.
+    """
+
+    def __init__(
+        self,
+        directory: str = "./cache/imagery",
+        max_bytes: int = 2 * 1024**3,
+        coordinate_precision: int = 5,
+        distance_step: int = 100,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.coordinate_precision = coordinate_precision
+        self.distance_step = distance_step
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Rebuild the LRU order from file modification times
+        cached_files = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".jpeg"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, filename))
+            except FileNotFoundError:
+                continue
+            cached_files.append((stat.st_mtime, filename[:-5], stat.st_size))
+        for _, key, size in sorted(cached_files):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def key(
+        self,
+        latitude: float,
+        longitude: float,
+        ground_distance: int,
+        image_size: int = None,
+    ) -> str:
+        """Return the content key for a camera position and non-standard size."""
+        quantized_distance = (
+            round(ground_distance / self.distance_step) * self.distance_step
+        )
+        view = (
+            f"{latitude:.{self.coordinate_precision}f},"
+            f"{longitude:.{self.coordinate_precision}f},"
+            f"{quantized_distance}"
+        )
+        if image_size is not None:
+            view += f",{image_size}px"
+        return hashlib.sha256(view.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.jpeg")
+
+    def get(
+        self,
+        latitude: float,
+        longitude: float,
+        ground_distance: int,
+        image_size: int = None,
+    ):
+        """
+        Look up a cached screenshot.
+
+        Returns:
+            str: Path of the cached JPEG, or None on a miss
+        """
+        key = self.key(latitude, longitude, ground_distance, image_size)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        path = self._path(key)
+        try:
+            # Persist the recency so the LRU order survives restarts
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another process sharing the cache directory
+            with self._lock:
+                self._total_bytes -= self._entries.pop(key, 0)
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return path
+
+    def contains(
+        self,
+        latitude: float,
+        longitude: float,
+        ground_distance: int,
+        image_size: int = None,
+    ) -> bool:
+        """Check for a cached screenshot without counting a hit or miss."""
+        key = self.key(latitude, longitude, ground_distance, image_size)
+        with self._lock:
+            return key in self._entries
+
+    def put_bytes(
+        self,
+        latitude: float,
+        longitude: float,
+        ground_distance: int,
+        jpeg_data: bytes,
+        image_size: int = None,
+    ):
+        """Store an encoded screenshot that has not been written to disk yet."""
+        key = self.key(latitude, longitude, ground_distance, image_size)
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(jpeg_data)
+        os.replace(temp_path, path)
+        self._add(key, path)
+
+    def _add(self, key: str, path: str):
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            # Already evicted by another process sharing the cache directory
+            return
+
+        evicted = []
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                evicted.append(old_key)
+
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current cache size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
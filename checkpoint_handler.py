@@ -0,0 +1,63 @@
+import json
+import os
+
+
+class CheckpointStore:
+    """
+    Per-base checkpoints of an analysis in progress.
+
+    After every analyst step the session state of a base is rewritten
+    atomically to one small JSON file: the camera position, the steps taken so
+    far (each with the view it looked at, its screenshot and the analyst's
+    report) and the duplicate-frame bookkeeping. A base that fails or is
+    interrupted resumes from its last completed step on the next run instead
+    of repeating the Gemini calls and captures already paid for. The
+    checkpoint is discarded once the base's result is saved.
+
+    Attributes:
+        directory: Directory holding one {base_id}.json file per base.
+    """
+
+    def __init__(self, directory: str = "./checkpoints"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, base_id: str) -> str:
+        return os.path.join(self.directory, f"{base_id}.json")
+
+    def exists(self, base_id: str) -> bool:
+        """Check whether a base has a checkpoint to resume from."""
+        return os.path.exists(self._path(base_id))
+
+    def load(self, base_id: str):
+        """
+        Read a base's checkpoint.
+
+        Returns:
+            dict: The saved session state, or None if there is no usable one
+        """
+        try:
+            with open(self._path(base_id), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except json.JSONDecodeError:
+            print(f"Ignoring corrupt checkpoint for base {base_id}")
+            return None
+
+    def save(self, base_id: str, state: dict):
+        """Atomically replace a base's checkpoint with `state`."""
+        path = self._path(base_id)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    def discard(self, base_id: str):
+        """Delete a base's checkpoint once its result is safely stored."""
+        try:
+            os.remove(self._path(base_id))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,116 @@
+import pandas as pd
+
+COLUMNS = [
+    "Base ID",
+    "Country",
+    "Latitude",
+    "Longitude",
+    "Confidence Level",
+    "Overall Assessment",
+]
+
+# The store column behind each sortable table column
+SORT_COLUMNS = {
+    "Country": "country",
+    "Confidence Level": "confidence_score",
+    "Latitude": "latitude",
+    "Longitude": "longitude",
+}
+
+
+class DashboardData:
+    """
+    Everything the dashboard pages read, built from the store's overview rows.
+
+    The table comes from one call to the store's `query`, which a
+    SQLiteResultStore serves from its indexed columns without decoding any
+    analysis, and the counts are taken from that table. The app caches the
+    data per store version, so reruns triggered by clicks only read the
+    prepared structures and new results are picked up as soon as they are
+    stored. Filtered, sorted pages of the list are queried from the store as
+    well, and full analyses are not kept; the detail page loads the one it
+    shows from the store.
+
+    Attributes:
+        store: The result store pages of the list are queried from.
+        version: The store version the data was built from.
+        bases_df: One row per base with its id, country, coordinates,
+            confidence level and overall assessment, indexed by base id.
+        country_counts: Number of bases per country, largest first.
+        confidence_counts: Number of bases per confidence level.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.version = store.version()
+        self.bases_df = _bases_frame(store.query())
+
+        self.country_counts = self.bases_df["Country"].value_counts().to_dict()
+        self.confidence_counts = (
+            self.bases_df["Confidence Level"].value_counts().to_dict()
+        )
+
+    def __len__(self) -> int:
+        return len(self.bases_df)
+
+    def filter_bases(
+        self,
+        countries: list = None,
+        confidence_levels: list = None,
+        sort_by: str = "Country",
+        descending: bool = False,
+        limit: int = None,
+        offset: int = 0,
+    ) -> pd.DataFrame:
+        """
+        Query a page of the bases table from the store.
+
+        Args:
+            countries: Countries to keep, or None for all
+            confidence_levels: Confidence levels to keep, or None for all
+            sort_by: Column to sort by; confidence sorts from High to Unknown
+            descending: Reverse the sort order
+            limit: Maximum number of rows to return
+            offset: Number of matching rows to skip
+
+        Returns:
+            pd.DataFrame: The matching rows
+        """
+        rows = self.store.query(
+            country=countries or None,
+            confidence=confidence_levels or None,
+            order_by=SORT_COLUMNS[sort_by],
+            descending=descending,
+            limit=limit,
+            offset=offset,
+        )
+        return _bases_frame(rows)
+
+    def count_bases(
+        self, countries: list = None, confidence_levels: list = None
+    ) -> int:
+        """Return the number of bases `filter_bases` matches."""
+        return self.store.count(
+            country=countries or None, confidence=confidence_levels or None
+        )
+
+
+def _bases_frame(rows) -> pd.DataFrame:
+    """Build the bases table, indexed by base id, from store overview rows."""
+    bases_df = pd.DataFrame(
+        [
+            {
+                "Base ID": row["base_id"],
+                "Country": row["country"] or "Unknown",
+                "Latitude": float(row["latitude"] or 0),
+                "Longitude": float(row["longitude"] or 0),
+                "Confidence Level": row["confidence_score"] or "Unknown",
+                "Overall Assessment": (
+                    row["overall_assessment"] or "No assessment available"
+                ),
+            }
+            for row in rows
+        ],
+        columns=COLUMNS,
+    )
+    return bases_df.set_index("Base ID", drop=False)
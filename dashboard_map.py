@@ -0,0 +1,145 @@
+import json
+
+import folium
+from folium.plugins import FastMarkerCluster, HeatMap
+
+CONFIDENCE_COLORS = {
+    "High": "red",
+    "Medium": "orange",
+    "Low": "green",
+    "Unknown": "gray",
+}
+
+# Heat map weight of each confidence level
+CONFIDENCE_WEIGHTS = {"High": 1.0, "Medium": 0.6, "Low": 0.3}
+
+MARKERS = "markers"
+CLUSTERS = "clusters"
+HEATMAP = "heatmap"
+
+# Above these point counts the map switches to clusters, then to a heat map
+MARKER_LIMIT = 1000
+CLUSTER_LIMIT = 50000
+
+# Builds each clustered marker in the browser and its popup only when opened,
+# from the [latitude, longitude, confidence, country] rows of the layer
+_CLUSTER_CALLBACK = """
+function (row) {
+    var colors = %s;
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+        radius: 6,
+        color: colors[row[2]] || "blue",
+        fillOpacity: 0.8,
+    });
+    marker.bindPopup(function () {
+        return "<b>Country:</b> " + row[3] + "<br>" +
+            "<b>Confidence Level:</b> " + row[2] + "<br>" +
+            "<b>Coordinates:</b> " + row[0].toFixed(5) + ", " + row[1].toFixed(5);
+    });
+    return marker;
+};
+"""
+
+
+def choose_map_mode(
+    point_count: int,
+    marker_limit: int = MARKER_LIMIT,
+    cluster_limit: int = CLUSTER_LIMIT,
+) -> str:
+    """Return the cheapest map mode that still shows `point_count` bases well."""
+    if point_count <= marker_limit:
+        return MARKERS
+    if point_count <= cluster_limit:
+        return CLUSTERS
+    return HEATMAP
+
+
+def bases_geojson(bases_df) -> dict:
+    """
+    Build a GeoJSON FeatureCollection of the bases table.
+
+    Args:
+        bases_df: The DashboardData bases table
+
+    Returns:
+        dict: One Point feature per base, carrying its id, country and
+            confidence level as properties
+    """
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [longitude, latitude]},
+            "properties": {
+                "base_id": base_id,
+                "country": country,
+                "confidence": confidence,
+                "color": CONFIDENCE_COLORS.get(confidence, "blue"),
+            },
+        }
+        for base_id, country, latitude, longitude, confidence in zip(
+            bases_df["Base ID"],
+            bases_df["Country"],
+            bases_df["Latitude"],
+            bases_df["Longitude"],
+            bases_df["Confidence Level"],
+        )
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+
+def build_bases_map(bases_df, mode: str) -> folium.Map:
+    """
+    Build the home page map as a single layer, whatever the number of bases.
+
+    In "markers" mode the bases form one GeoJSON layer whose popups are
+    rendered from the feature properties when clicked. "clusters" sends only
+    the coordinate rows and lets the browser build clustered markers, and
+    "heatmap" sends weighted points.
+
+    Args:
+        bases_df: The DashboardData bases table
+        mode: One of "markers", "clusters" or "heatmap"
+
+    Returns:
+        folium.Map: The map
+    """
+    m = folium.Map(location=[20, 0], zoom_start=2, prefer_canvas=True)
+
+    if mode == MARKERS:
+        folium.GeoJson(
+            bases_geojson(bases_df),
+            name="Bases",
+            marker=folium.CircleMarker(radius=6, fill_opacity=0.8),
+            style_function=lambda feature: {
+                "color": feature["properties"]["color"],
+                "fillColor": feature["properties"]["color"],
+            },
+            popup=folium.GeoJsonPopup(
+                fields=["country", "confidence", "base_id"],
+                aliases=["Country:", "Confidence Level:", "Base:"],
+            ),
+        ).add_to(m)
+    elif mode == CLUSTERS:
+        rows = bases_df[
+            ["Latitude", "Longitude", "Confidence Level", "Country"]
+        ].values.tolist()
+        FastMarkerCluster(
+            rows,
+            callback=_CLUSTER_CALLBACK % json.dumps(CONFIDENCE_COLORS),
+            name="Bases",
+        ).add_to(m)
+    elif mode == HEATMAP:
+        points = [
+            [latitude, longitude, CONFIDENCE_WEIGHTS.get(confidence, 0.1)]
+            for latitude, longitude, confidence in zip(
+                bases_df["Latitude"],
+                bases_df["Longitude"],
+                bases_df["Confidence Level"],
+            )
+        ]
+        HeatMap(points, name="Bases", radius=12).add_to(m)
+    else:
+        raise RuntimeError(f"Unknown map mode: {mode}")
+
+    return m
+
@@ -0,0 +1,295 @@
+"""
+Content-addressed storage for captured frames.
+
+Frames are stored once per unique content, under the SHA-256 of the captured
+JPEG bytes, and analyst reports reference them by that hash. Re-analyzing a
+base or revisiting a view costs no extra disk space, and the store is kept
+under a quota by garbage-collecting frames no stored analysis or checkpoint
+references.
+
+Usage:
+    python frame_store_handler.py --results data.jsonl --max-gb 20 --max-age-days 30
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from thumbnail_handler import THUMBNAIL_SIZES, thumbnail_path, write_thumbnails
+
+JPEG = "jpeg"
+WEBP = "webp"
+
+CODEC_EXTENSIONS = {JPEG: ".jpeg", WEBP: ".webp"}
+
+
+def frame_digest(jpeg_data: bytes) -> str:
+    """Return the content hash frames are stored and referenced by."""
+    return hashlib.sha256(jpeg_data).hexdigest()
+
+
+class FrameStore:
+    """
+    Content-addressed blob store for captured frames.
+
+    A frame is stored at {directory}/{hash[:2]}/{hash}{extension}, together
+    with its thumbnail_handler previews. With the "jpeg" codec the captured
+    bytes are kept as they are. "webp" re-encodes them as lossy WebP at
+    quality 90, which is smaller but loses some detail on top of the JPEG
+    compression. The hash is always that of the captured JPEG, so the same
+    capture maps to the same blob whatever the codec. Storing a frame that is
+    already present only refreshes its access time, which `gc` uses to evict
+    the least recently used unreferenced frames first.
+
+    Attributes:
+        directory: Root directory of the blobs.
+        codec: How new frames are encoded: "jpeg" or "webp".
+        max_bytes: Disk quota enforced by `gc`, or None for no quota.
+        read_only: Only look frames up, without creating the directory, as
+            the dashboard does.
+        stored: Frames written since the store was opened.
+        deduplicated: Frames that were already stored.
+    """
+
+    def __init__(
+        self,
+        directory: str = "./frames",
+        codec: str = JPEG,
+        max_bytes: int = 20 * 1024**3,
+        read_only: bool = False,
+    ):
+        if codec not in CODEC_EXTENSIONS:
+            raise RuntimeError(f"Unknown frame codec: {codec}")
+        self.directory = directory
+        self.codec = codec
+        self.max_bytes = max_bytes
+        self.read_only = read_only
+        self.stored = 0
+        self.deduplicated = 0
+        self._lock = threading.Lock()
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+
+    def _blob_path(self, digest: str, extension: str) -> str:
+        return os.path.join(self.directory, digest[:2], f"{digest}{extension}")
+
+    def path(self, digest: str):
+        """Return the path of a stored frame, or None if it is not stored."""
+        for extension in set(CODEC_EXTENSIONS.values()):
+            path = self._blob_path(digest, extension)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def put(self, jpeg_data: bytes) -> str:
+        """
+        Store a captured frame unless the same frame is already stored.
+
+        Args:
+            jpeg_data: The captured JPEG bytes
+
+        Returns:
+            str: Path of the stored frame
+        """
+        digest = frame_digest(jpeg_data)
+        existing = self.path(digest)
+        if existing is not None:
+            os.utime(existing)
+            with self._lock:
+                self.deduplicated += 1
+            return existing
+
+        path = self._blob_path(digest, CODEC_EXTENSIONS[self.codec])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if self.codec == JPEG:
+            with open(temp_path, "wb") as f:
+                f.write(jpeg_data)
+        else:
+            image = Image.open(BytesIO(jpeg_data)).convert("RGB")
+            image.save(temp_path, "WEBP", quality=90, method=6)
+        os.replace(temp_path, path)
+        write_thumbnails(path, jpeg_data)
+        with self._lock:
+            self.stored += 1
+        return path
+
+    def _blobs(self) -> list:
+        """Return (last access, size with previews, path) of every stored frame."""
+        blobs = []
+        for path in glob.glob(os.path.join(self.directory, "??", "*")):
+            if path.endswith(".tmp") or not os.path.isfile(path):
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            size = stat.st_size
+            for preview_path in _preview_paths(path):
+                try:
+                    size += os.path.getsize(preview_path)
+                except FileNotFoundError:
+                    pass
+            blobs.append((max(stat.st_atime, stat.st_mtime), size, path))
+        return blobs
+
+    def size_bytes(self) -> int:
+        """Return the disk space used by the stored frames and their previews."""
+        return sum(size for _, size, _ in self._blobs())
+
+    def gc(
+        self,
+        referenced: set,
+        max_age_days: float = None,
+        grace_seconds: float = 3600,
+    ) -> dict:
+        """
+        Delete unreferenced frames until the store is within its quota.
+
+        Unreferenced frames older than `max_age_days` are deleted first, then
+        the least recently used unreferenced frames until the store fits in
+        `max_bytes`. A frame's previews count towards the quota and are
+        deleted with it. Frames touched within the last `grace_seconds` are kept,
+        as they may belong to a base another process is still analyzing.
+
+        Args:
+            referenced: Hashes of the frames that must be kept
+            max_age_days: Age after which unreferenced frames are deleted
+            grace_seconds: Minimum age of a frame before it can be deleted
+
+        Returns:
+            dict: Number of deleted frames, bytes freed and bytes still used
+        """
+        now = time.time()
+        blobs = sorted(self._blobs())
+        total = sum(size for _, size, _ in blobs)
+        deleted = 0
+        freed = 0
+
+        for last_used, size, path in blobs:
+            digest = os.path.splitext(os.path.basename(path))[0]
+            if digest in referenced or now - last_used < grace_seconds:
+                continue
+            expired = (
+                max_age_days is not None and now - last_used > max_age_days * 86400
+            )
+            over_quota = self.max_bytes is not None and total - freed > self.max_bytes
+            if not (expired or over_quota):
+                continue
+
+            os.remove(path)
+            for preview_path in _preview_paths(path):
+                try:
+                    os.remove(preview_path)
+                except FileNotFoundError:
+                    pass
+            deleted += 1
+            freed += size
+
+        print(f"Frame store GC deleted {deleted} frames, freed {freed / 1e6:.1f} MB")
+        return {"deleted": deleted, "freed_bytes": freed, "used_bytes": total - freed}
+
+    def stats(self) -> dict:
+        """Return how many frames were written and deduplicated."""
+        with self._lock:
+            return {"stored": self.stored, "deduplicated": self.deduplicated}
+
+
+def _preview_paths(path: str) -> list:
+    return [thumbnail_path(path, size) for size in THUMBNAIL_SIZES]
+
+
+def referenced_frames(analyses) -> set:
+    """Collect the frame hashes referenced by the analyst steps of analyses."""
+    referenced = set()
+    for analysis in analyses:
+        for key, report in analysis.items():
+            if key.startswith("Analyst ") and isinstance(report, dict):
+                if report.get("frame_hash"):
+                    referenced.add(report["frame_hash"])
+    return referenced
+
+
+def checkpoint_frames(directory: str = "./checkpoints") -> set:
+    """Collect the frame hashes referenced by in-progress checkpoints."""
+    referenced = set()
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            with open(path, "r") as f:
+                steps = json.load(f).get("steps", [])
+        except (OSError, json.JSONDecodeError):
+            continue
+        referenced.update(
+            step["analysis"]["frame_hash"]
+            for step in steps
+            if step.get("analysis", {}).get("frame_hash")
+        )
+    return referenced
+
+
+_frame_store = None
+
+
+def configure_frame_store(store) -> FrameStore:
+    """Make `store` receive every captured frame, or None to disable it."""
+    global _frame_store
+    _frame_store = store
+    return store
+
+
+def get_frame_store():
+    return _frame_store
+
+
+def save_frame(jpeg_data: bytes, output_file_path: str) -> str:
+    """
+    Save a captured frame where the providers have always saved it.
+
+    With a frame store configured the frame goes to the store instead of
+    `output_file_path`, so every unique frame is stored once.
+
+    Returns:
+        str: The path the frame was saved to
+    """
+    if _frame_store is not None:
+        return _frame_store.put(jpeg_data)
+    with open(output_file_path, "wb") as f:
+        f.write(jpeg_data)
+    write_thumbnails(output_file_path, jpeg_data)
+    return output_file_path
+
+
+def main():
+    from results_handler import open_result_store
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--directory", default="./frames")
+    parser.add_argument("--results", default="data.jsonl")
+    parser.add_argument("--checkpoints", default="./checkpoints")
+    parser.add_argument("--max-gb", type=float, default=20)
+    parser.add_argument("--max-age-days", type=float, default=None)
+    parser.add_argument("--grace-seconds", type=float, default=3600)
+    args = parser.parse_args()
+
+    store = FrameStore(args.directory, max_bytes=int(args.max_gb * 1024**3))
+    referenced = referenced_frames(open_result_store(args.results, read_only=True))
+    referenced |= checkpoint_frames(args.checkpoints)
+    print(f"{len(referenced)} frames are referenced")
+    print(
+        store.gc(
+            referenced,
+            max_age_days=args.max_age_days,
+            grace_seconds=args.grace_seconds,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
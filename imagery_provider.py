@@ -0,0 +1,429 @@
+import glob
+import math
+import os
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from io import BytesIO
+
+from PIL import Image
+
+from frame_store_handler import save_frame
+
+try:
+    import numpy as np
+    import rasterio
+    from rasterio.enums import Resampling
+    from rasterio.warp import transform, transform_bounds
+    from rasterio.windows import from_bounds
+except ImportError:
+    rasterio = None
+
+# Ground width covered by a 1024 pixel frame, as a multiple of the camera's
+# distance to the ground. Matches the field of view of a Google Earth screenshot.
+VIEW_WIDTH_FACTOR = 1.15
+MIN_VIEW_WIDTH = 100
+IMAGE_SIZE = 1024
+
+METERS_PER_DEGREE_LATITUDE = 110540
+METERS_PER_DEGREE_LONGITUDE = 111320
+
+RASTER_EXTENSIONS = (".tif", ".tiff", ".vrt")
+
+
+class ImageryProvider(ABC):
+    """
+    Interface for the imagery sources used by `team_analysis`.
+
+    A provider captures a square frame centred on a coordinate, at a camera
+    distance from the ground, saves it with `save_frame` as
+    ./screenshots/{filename}.jpeg along with its thumbnail_handler previews
+    (or in the configured FrameStore) and returns the encoded JPEG bytes,
+    which are handed to the analyst as they are. The camera distance sets
+    the ground resolution, `meters_per_pixel(ground_distance)`, so a frame of
+    `image_size` pixels covers `image_size` times that many meters.
+    `ScreenshotHandler` renders frames with Google Earth in Chrome,
+    `LocalRasterProvider` cuts them out of pre-downloaded rasters.
+    """
+
+    @abstractmethod
+    def screenshot(
+        self,
+        latitude: float,
+        longitude: float,
+        filename: str,
+        ground_distance: int = 0,
+        output_file_path: str = None,
+        image_size: int = IMAGE_SIZE,
+    ):
+        """
+        Captures the view at the specified coordinates.
+
+        Args:
+            latitude: Location latitude
+            longitude: Location longitude
+            filename: Screenshot name, relative to ./screenshots, without extension
+            ground_distance: Camera distance from the ground in meters
+            output_file_path: Optional custom file path for the screenshot
+            image_size: Width and height of the frame in pixels
+
+        Returns:
+            bytes: The JPEG-encoded frame if successful, None otherwise
+        """
+
+    def meters_per_pixel(self, ground_distance: float) -> float:
+        """Ground resolution of the frames captured at `ground_distance`."""
+        return view_width(ground_distance) / IMAGE_SIZE
+
+    def quit(self):
+        """Release any resources held by the provider"""
+
+
+def view_width(ground_distance: float, image_size: int = IMAGE_SIZE) -> float:
+    """Ground width in meters covered by a frame taken at `ground_distance`."""
+    width = max(ground_distance * VIEW_WIDTH_FACTOR, MIN_VIEW_WIDTH)
+    return width * image_size / IMAGE_SIZE
+
+
+def frame_hash(jpeg_data: bytes, hash_size: int = 8) -> int:
+    """
+    Perceptual difference hash (dHash) of an encoded frame.
+
+    The frame is shrunk to a (hash_size + 1) x hash_size grayscale thumbnail and
+    each bit records whether a pixel is brighter than its right neighbour, so
+    frames that look alike hash to values a few bits apart regardless of JPEG
+    noise or small rendering differences.
+
+    Args:
+        jpeg_data: The encoded frame
+        hash_size: Bits per row and number of rows of the hash
+
+    Returns:
+        int: A hash_size * hash_size bit hash
+    """
+    image = Image.open(BytesIO(jpeg_data))
+    # Let the JPEG decoder shrink the frame up to 8x instead of decoding it whole
+    image.draft("L", (hash_size * 8, hash_size * 8))
+    thumbnail = image.convert("L").resize(
+        (hash_size + 1, hash_size), Image.Resampling.LANCZOS
+    )
+    pixels = list(thumbnail.getdata())
+    value = 0
+    for row in range(hash_size):
+        for column in range(hash_size):
+            left = pixels[row * (hash_size + 1) + column]
+            right = pixels[row * (hash_size + 1) + column + 1]
+            value = value << 1 | (left > right)
+    return value
+
+
+def hash_distance(first: int, second: int) -> int:
+    """Number of differing bits between two frame hashes."""
+    return (first ^ second).bit_count()
+
+
+def ground_offset(latitude, longitude, origin_latitude, origin_longitude):
+    """Return the (east, north) offset in meters of a point from an origin."""
+    east = (
+        (longitude - origin_longitude)
+        * METERS_PER_DEGREE_LONGITUDE
+        * math.cos(math.radians(origin_latitude))
+    )
+    north = (latitude - origin_latitude) * METERS_PER_DEGREE_LATITUDE
+    return east, north
+
+
+class LocalRasterProvider(ImageryProvider):
+    """
+    Serves frames from local GeoTIFF or VRT mosaics without a browser or network.
+
+    Every raster in `directory` is opened once and only the window around the
+    requested view is read from disk, resampled to the frame size, so large
+    files are never loaded whole. Datasets are not thread safe: give each
+    worker its own provider.
+
+    Attributes:
+        datasets: Open rasterio datasets with their WGS84 bounds.
+    """
+
+    def __init__(self, directory: str = "./imagery"):
+        if rasterio is None:
+            raise RuntimeError(
+                "LocalRasterProvider requires rasterio (pip install rasterio)."
+            )
+
+        self.datasets = []
+        pattern = os.path.join(directory, "**", "*")
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            if not path.lower().endswith(RASTER_EXTENSIONS):
+                continue
+            dataset = rasterio.open(path)
+            bounds = transform_bounds(dataset.crs, "EPSG:4326", *dataset.bounds)
+            self.datasets.append((dataset, bounds))
+
+        if not self.datasets:
+            raise RuntimeError(f"No raster files found in {directory}")
+
+        os.makedirs("screenshots", exist_ok=True)
+
+    def _find_dataset(self, latitude: float, longitude: float):
+        for dataset, (west, south, east, north) in self.datasets:
+            if west <= longitude <= east and south <= latitude <= north:
+                return dataset
+        return None
+
+    def _view_bounds(self, dataset, latitude, longitude, ground_distance, image_size):
+        """Return the (left, bottom, right, top) of the view in the dataset's CRS."""
+        half_width = view_width(ground_distance, image_size) / 2
+
+        if dataset.crs.is_geographic:
+            half_lat = half_width / METERS_PER_DEGREE_LATITUDE
+            half_lon = half_width / (
+                METERS_PER_DEGREE_LONGITUDE * math.cos(math.radians(latitude))
+            )
+            return (
+                longitude - half_lon,
+                latitude - half_lat,
+                longitude + half_lon,
+                latitude + half_lat,
+            )
+
+        xs, ys = transform("EPSG:4326", dataset.crs, [longitude], [latitude])
+        return (
+            xs[0] - half_width,
+            ys[0] - half_width,
+            xs[0] + half_width,
+            ys[0] + half_width,
+        )
+
+    def screenshot(
+        self,
+        latitude: float,
+        longitude: float,
+        filename: str,
+        ground_distance: int = 0,
+        output_file_path: str = None,
+        image_size: int = IMAGE_SIZE,
+    ):
+        if output_file_path is None:
+            output_file_path = f"./screenshots/{filename}.jpeg"
+
+        dataset = self._find_dataset(latitude, longitude)
+        if dataset is None:
+            print(f"No local imagery for coordinates: lat:{latitude},long:{longitude}")
+            return None
+
+        window = from_bounds(
+            *self._view_bounds(
+                dataset, latitude, longitude, ground_distance, image_size
+            ),
+            transform=dataset.transform,
+        )
+        bands = list(range(1, min(dataset.count, 3) + 1))
+        pixels = dataset.read(
+            bands,
+            window=window,
+            out_shape=(len(bands), image_size, image_size),
+            resampling=Resampling.bilinear,
+            boundless=True,
+            fill_value=0,
+        )
+
+        if pixels.dtype != np.uint8:
+            # Stretch higher bit-depth imagery into the 8-bit JPEG range
+            low, high = np.percentile(pixels, (2, 98))
+            scale = 255 / (high - low) if high > low else 0
+            pixels = np.clip((pixels - low) * scale, 0, 255).astype(np.uint8)
+
+        image = Image.fromarray(np.moveaxis(pixels, 0, -1).squeeze())
+        buffer = BytesIO()
+        image.convert("RGB").save(buffer, "JPEG", quality=95)
+        jpeg_data = buffer.getvalue()
+        saved_path = save_frame(jpeg_data, output_file_path)
+        print(f"Screenshot saved to {saved_path}")
+        return jpeg_data
+
+    def quit(self):
+        """Close every open raster"""
+        for dataset, _ in self.datasets:
+            dataset.close()
+
+
+class MultiResolutionProvider(ImageryProvider):
+    """
+    Serves zoom and pan views as local crops of a few large master frames.
+
+    The first view of an area is captured as a master frame `extent_factor`
+    times wider than a normal frame, with `detail_factor` times its ground
+    resolution. Later views that fall inside a cached master, and need no more
+    than `max_upscale` times the master's resolution, are cropped and resampled
+    locally instead of navigating the wrapped provider again. With the default
+    factors one 3072 pixel master serves pans of a quarter frame and zooms
+    from half up to one and a half times the first view's distance. Only
+    views outside every cached extent, or needing more detail, trigger a new
+    capture.
+    The master's camera distance is chosen from the wrapped provider's
+    `meters_per_pixel`, which for ScreenshotHandler depends on its window, so
+    the crops cover the ground they claim to. The wrapped provider must be
+    able to capture frames of the master size; for ScreenshotHandler the
+    browser window has to fit them.
+
+    Attributes:
+        provider: The wrapped ImageryProvider used for master captures.
+        masters: Cached (latitude, longitude, meters_per_pixel, image) frames,
+            most recent last.
+        derived: Number of views served from a master frame.
+        captured: Number of master frames captured.
+    """
+
+    def __init__(
+        self,
+        provider: ImageryProvider,
+        extent_factor: float = 1.5,
+        detail_factor: float = 2.0,
+        max_upscale: float = 1.0,
+        max_masters: int = 2,
+    ):
+        self.provider = provider
+        self.extent_factor = extent_factor
+        self.detail_factor = detail_factor
+        self.max_upscale = max_upscale
+        self.max_masters = max_masters
+        self.masters = []
+        self.derived = 0
+        self.captured = 0
+
+    @property
+    def master_size(self) -> int:
+        return round(IMAGE_SIZE * self.extent_factor * self.detail_factor)
+
+    def _crop_box(self, master, latitude, longitude, ground_distance):
+        """Return the master pixel box covering a view, or None if it cannot."""
+        master_latitude, master_longitude, meters_per_pixel, image = master
+
+        # Resampling beyond max_upscale would invent detail the master lacks
+        requested_meters_per_pixel = view_width(ground_distance) / IMAGE_SIZE
+        upscale = meters_per_pixel / requested_meters_per_pixel
+        if upscale > self.max_upscale + 1e-9:
+            return None
+
+        east, north = ground_offset(
+            latitude, longitude, master_latitude, master_longitude
+        )
+        center_x = image.width / 2 + east / meters_per_pixel
+        center_y = image.height / 2 - north / meters_per_pixel
+        half_size = view_width(ground_distance) / meters_per_pixel / 2
+        box = (
+            center_x - half_size,
+            center_y - half_size,
+            center_x + half_size,
+            center_y + half_size,
+        )
+        if box[0] < 0 or box[1] < 0 or box[2] > image.width or box[3] > image.height:
+            return None
+        return box
+
+    def _master_distance(self, ground_distance):
+        """Return the camera distance giving the master its target resolution."""
+        width = view_width(ground_distance)
+        target_meters_per_pixel = width / IMAGE_SIZE / self.detail_factor
+        # The provider's resolution is proportional to view_width
+        provider_scale = self.provider.meters_per_pixel(ground_distance) / width
+        return target_meters_per_pixel / provider_scale / VIEW_WIDTH_FACTOR
+
+    def _capture_master(self, latitude, longitude, ground_distance, filename):
+        master_distance = self._master_distance(ground_distance)
+        jpeg_data = self.provider.screenshot(
+            latitude=latitude,
+            longitude=longitude,
+            filename=f"{filename}_master",
+            ground_distance=master_distance,
+            image_size=self.master_size,
+        )
+        if jpeg_data is None:
+            return None
+
+        image = Image.open(BytesIO(jpeg_data)).convert("RGB")
+        meters_per_pixel = self.provider.meters_per_pixel(master_distance)
+        self.masters.append((latitude, longitude, meters_per_pixel, image))
+        del self.masters[: -self.max_masters]
+        self.captured += 1
+        return self.masters[-1]
+
+    def screenshot(
+        self,
+        latitude: float,
+        longitude: float,
+        filename: str,
+        ground_distance: int = 0,
+        output_file_path: str = None,
+        image_size: int = IMAGE_SIZE,
+    ):
+        if output_file_path is None:
+            output_file_path = f"./screenshots/{filename}.jpeg"
+
+        for master in reversed(self.masters):
+            box = self._crop_box(master, latitude, longitude, ground_distance)
+            if box is not None:
+                self.derived += 1
+                break
+        else:
+            master = self._capture_master(
+                latitude, longitude, ground_distance, filename
+            )
+            if master is None:
+                return None
+            box = self._crop_box(master, latitude, longitude, ground_distance)
+            if box is None:
+                # Too close for any master the provider can capture
+                return self.provider.screenshot(
+                    latitude=latitude,
+                    longitude=longitude,
+                    filename=filename,
+                    ground_distance=ground_distance,
+                    output_file_path=output_file_path,
+                    image_size=image_size,
+                )
+
+        view = master[3].resize(
+            (image_size, image_size), Image.Resampling.LANCZOS, box=box
+        )
+        buffer = BytesIO()
+        view.save(buffer, "JPEG", quality=95)
+        jpeg_data = buffer.getvalue()
+        saved_path = save_frame(jpeg_data, output_file_path)
+        print(f"Screenshot derived from master frame to {saved_path}")
+        return jpeg_data
+
+    @contextmanager
+    def speculating(self, views, max_tabs: int = 2):
+        """
+        Prefetch the masters of views no cached master covers during the block.
+
+        Only does anything if the wrapped provider can speculate, e.g. a
+        ScreenshotHandler with a cache, which then serves the master capture.
+        """
+        speculating = getattr(self.provider, "speculating", None)
+        master_views = []
+        for latitude, longitude, ground_distance in views:
+            if any(
+                self._crop_box(master, latitude, longitude, ground_distance)
+                is not None
+                for master in self.masters
+            ):
+                continue
+            master_distance = self._master_distance(ground_distance)
+            master_views.append(
+                (latitude, longitude, master_distance, self.master_size)
+            )
+        if speculating is None or not master_views:
+            yield
+            return
+        with speculating(master_views, max_tabs):
+            yield
+
+    def stats(self) -> dict:
+        """Return how many views were captured versus derived locally."""
+        return {"masters_captured": self.captured, "views_derived": self.derived}
+
+    def quit(self):
+        self.provider.quit()
@@ -1,6 +1,14 @@
 import json
 
-from google import genai
+from google.genai import types
+
+from llm_clients import gemini_client
+from rate_limit_handler import get_rate_limiter
+from response_cache import image_bytes
+from tracing_handler import span
+
+# Gemini bills every image up to 384x384 pixels as 258 tokens
+IMAGE_TOKENS = 258
 
 
 class Analyst:
@@ -12,17 +20,35 @@ class Analyst:
     can be updated with results from previous analyses to build context.
 
     Attributes:
-        client: A genai.Client instance for interacting with the Gemini API.
+        client: The shared genai.Client for the API key, see llm_clients.
         model:
-        prompt: A string template used to instruct the Gemini model on how to
+        base_prompt: A string template used to instruct the Gemini model on how to
                 analyze images and format its response.
+        history: The PromptHistory holding context from previous analysts.
+        prompt_sizes: Estimated prompt size in tokens for each analyzed image.
+        response_cache: Optional ResponseCache used to record or replay responses.
+        rate_limiter: RateLimiter scheduling the Gemini requests.
     """
 
-    def __init__(self, api_key: str, model: str = "gemini-2.0-flash", country=None):
-        self.client = genai.Client(api_key=api_key)
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gemini-2.0-flash",
+        country=None,
+        history_token_budget: int = 600,
+        response_cache=None,
+        rate_limiter=None,
+    ):
+        self.client = gemini_client(api_key)
+        self.response_cache = response_cache
+        self.rate_limiter = (
+            rate_limiter if rate_limiter is not None else get_rate_limiter("gemini")
+        )
         self.country = country
         self.model = model
-        self.prompt = f"""
+        self.history = PromptHistory(token_budget=history_token_budget)
+        self.prompt_sizes = []
+        self.base_prompt = f"""
 SYSTEM (role):
 You are a US-Army satellite-imagery analyst.
 
@@ -48,6 +74,14 @@ F. ASCII only.
 
 """.strip()
 
+    @property
+    def prompt(self) -> str:
+        """The full prompt: instructions followed by the bounded analyst history."""
+        history = self.history.render()
+        if not history:
+            return self.base_prompt
+        return f"{self.base_prompt}\n{history}"
+
     def analyze_image(self, image):
         """
         Analyzes a satellite image to identify military structures and equipment.
@@ -57,34 +91,62 @@ F. ASCII only.
         equipment, and other significant features in the image.
 
         Args:
-            image: Image data (PIL Image, bytes, or file path) to be analyzed
+            image: Image data (PIL Image or JPEG bytes) to be analyzed
             country: String indicating the country whose military facilities are being examined
 
         Returns:
             str: Text analysis of the image containing findings about military structures,
                 equipment, and other relevant observations
         """
-
-        response = self.client.models.generate_content(
-            model=self.model,
-            contents=[image, self.prompt],
-        )
-        # Extract JSON string from Markdown code block
-        json_string = response.text
-        if json_string.startswith("```json"):
-            json_string = json_string[7:]  # Remove ```json\n
-        if json_string.endswith("```"):
-            json_string = json_string[:-3]  # Remove ```
-
-        response_json = json.loads(json_string.strip())
+        prompt = self.prompt
+        prompt_tokens = estimate_tokens(prompt)
+        self.prompt_sizes.append(prompt_tokens)
+        print(f"Analyst prompt size: ~{prompt_tokens} tokens")
+
+        # Encoded frames are uploaded as they are instead of being re-encoded
+        image_part = image
+        if isinstance(image, bytes):
+            image_part = types.Part.from_bytes(data=image, mime_type="image/jpeg")
+
+        def request():
+            # Timed per attempt, so quota waits and backoff are not included
+            with span(
+                "analyst.generate", model=self.model, prompt_tokens=prompt_tokens
+            ):
+                response = self.client.models.generate_content(
+                    model=self.model,
+                    contents=[image_part, prompt],
+                )
+            return response.text
+
+        def generate():
+            return self.rate_limiter.call(
+                request, tokens=prompt_tokens + IMAGE_TOKENS
+            )
+
+        if self.response_cache is None:
+            json_string = generate()
+        else:
+            json_string = self.response_cache.fetch(
+                self.model, prompt, generate, image_bytes=image_bytes(image)
+            )
+
+        with span("analyst.parse_json"):
+            # Extract JSON string from Markdown code block
+            if json_string.startswith("```json"):
+                json_string = json_string[7:]  # Remove ```json\n
+            if json_string.endswith("```"):
+                json_string = json_string[:-3]  # Remove ```
+
+            response_json = json.loads(json_string.strip())
         return response_json
 
     def append_results(self, analyst_index: int, results: dict):
         """
-        Appends the analysis and recommendations from a previous analyst to the current prompt.
+        Appends the analysis and recommendations from a previous analyst to the prompt history.
 
-        This method takes the results from a previous analysis step, formats them,
-        and adds them to the existing `self.prompt`. This provides context to the
+        This method takes the results from a previous analysis step and adds them
+        to `self.history`, which is rendered into the prompt. This provides context to the
         LLM for subsequent analysis, encouraging it to build upon previous findings
         while still thinking critically.
 
@@ -93,10 +155,85 @@ F. ASCII only.
             results: A dictionary containing the 'analysis' and 'things_to_continue_analyzing'
                     from the previous step.
         """
+        self.history.add(analyst_index=analyst_index, results=results)
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the number of LLM tokens in a text (~4 characters each)."""
+    return len(text) // 4 + 1
 
-        previous_analysis_prompt = f"""
+
+class PromptHistory:
+    """
+    Keeps the context passed between analysts within a fixed token budget.
+
+    The most recent steps are kept in full. Older steps are compacted into a
+    deduplicated list of their outstanding 'things_to_continue_analyzing'
+    items, and the oldest of those are dropped if the history still exceeds
+    the budget, so the prompt stays roughly the same size however many
+    analysts run.
+
+    Attributes:
+        token_budget: Maximum estimated tokens of rendered history.
+        keep_recent: Number of most recent steps kept in full.
+        steps: (analyst_index, results) pairs in the order they were added.
+    """
+
+    def __init__(self, token_budget: int = 600, keep_recent: int = 2):
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.steps = []
+
+    def add(self, analyst_index: int, results: dict):
+        self.steps.append((analyst_index, results))
+
+    def render(self) -> str:
+        """Return the history text to append to the analyst prompt."""
+        keep_recent = min(self.keep_recent, len(self.steps))
+        while True:
+            older = self.steps[: len(self.steps) - keep_recent]
+            recent = self.steps[len(self.steps) - keep_recent :]
+            # Items the recent steps still mention are already in the prompt
+            repeated = {item.lower() for item in _outstanding_items(recent)}
+            outstanding = [
+                item
+                for item in _outstanding_items(older)
+                if item.lower() not in repeated
+            ]
+
+            while True:
+                text = _render_history(outstanding, recent)
+                if estimate_tokens(text) <= self.token_budget or not outstanding:
+                    break
+                outstanding.pop(0)
+
+            if estimate_tokens(text) <= self.token_budget or keep_recent <= 1:
+                return text
+            keep_recent -= 1
+
+
+def _outstanding_items(steps: list) -> list:
+    items = {}
+    for _, results in steps:
+        for item in results.get("things_to_continue_analyzing", []):
+            if not isinstance(item, str) or item.strip().lower() in ("", "none"):
+                continue
+            # Later mentions move an item to the end, so the oldest go first
+            items.pop(item.strip().lower(), None)
+            items[item.strip().lower()] = item.strip()
+    return list(items.values())
+
+
+def _render_history(outstanding: list, recent: list) -> str:
+    history = ""
+    if outstanding:
+        history += f"""
+    "earlier_analysts_things_to_continue_analyzing":{outstanding}
+"""
+    for analyst_index, results in recent:
+        history += f"""
     "analyst":{analyst_index}
     "analysis":{results["analysis"]}
     "things_to_continue_analyzing":{results["things_to_continue_analyzing"]}
 """
-        self.prompt += previous_analysis_prompt.strip()
+    return history.strip()
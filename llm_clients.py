@@ -0,0 +1,96 @@
+import asyncio
+import threading
+
+from google import genai
+from openai import AsyncOpenAI, OpenAI
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+# One client per (provider, API key), shared by every analyst, commander and
+# worker thread. The clients are thread-safe and keep their HTTP connection
+# pools alive, so only the first request of a run pays for TCP and TLS setup.
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _shared(provider: str, api_key: str, factory):
+    key = (provider, api_key)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = factory()
+        return _clients[key]
+
+
+def gemini_client(api_key: str) -> genai.Client:
+    """
+    Return the shared Gemini client for an API key.
+
+    Async code uses the same client and connection pool through its `aio`
+    attribute, e.g. `await gemini_client(key).aio.models.generate_content(...)`.
+    """
+    return _shared("gemini", api_key, lambda: genai.Client(api_key=api_key))
+
+
+def openrouter_client(api_key: str) -> OpenAI:
+    """Return the shared OpenRouter client for an API key."""
+    return _shared(
+        "openrouter",
+        api_key,
+        lambda: OpenAI(
+            base_url=OPENROUTER_BASE_URL,
+            api_key=api_key,
+            # Retries are left to the rate limiter, which knows the quota
+            max_retries=0,
+        ),
+    )
+
+
+def async_openrouter_client(api_key: str) -> AsyncOpenAI:
+    """
+    Return the shared asynchronous OpenRouter client for an API key.
+
+    The client's connection pool belongs to the event loop that first uses
+    it, so share it between coroutines of one loop only.
+    """
+    return _shared(
+        "openrouter-async",
+        api_key,
+        lambda: AsyncOpenAI(
+            base_url=OPENROUTER_BASE_URL, api_key=api_key, max_retries=0
+        ),
+    )
+
+
+def close_clients():
+    """
+    Close the connection pools of all shared clients.
+
+    Async clients are closed on the running event loop when called from one,
+    and on a short-lived loop otherwise.
+    """
+    with _clients_lock:
+        clients = list(_clients.items())
+        _clients.clear()
+
+    for (provider, _), client in clients:
+        if provider.endswith("-async"):
+            _close_async(client)
+            continue
+        close = getattr(client, "close", None)
+        if close is not None:
+            close()
+
+
+def _close_async(client):
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    try:
+        if loop is not None:
+            loop.create_task(client.close())
+        else:
+            asyncio.run(client.close())
+    except Exception as e:
+        # The loop that opened the connections may be gone already
+        print(f"Error closing {type(client).__name__}: {e}")
@@ -1,4 +1,7 @@
-from openai import OpenAI
+from llm_analyst import estimate_tokens
+from llm_clients import openrouter_client
+from rate_limit_handler import get_rate_limiter
+from tracing_handler import span
 
 
 class Commander:
@@ -12,6 +15,8 @@ class Commander:
     Attributes:
         prompt (str): The prompt string used to instruct the LLM, which includes
                     a summary of previous analyst reports.
+        response_cache: Optional ResponseCache used to record or replay responses.
+        rate_limiter: RateLimiter scheduling the OpenRouter requests.
     """
 
     def __init__(
@@ -19,12 +24,15 @@ class Commander:
         api_key: str,
         analyst_results: list,
         model: str = "deepseek/deepseek-r1:free",
+        response_cache=None,
+        rate_limiter=None,
     ):
-        self.client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_key,
-        )
+        self.client = openrouter_client(api_key)
         self.model = model
+        self.response_cache = response_cache
+        self.rate_limiter = (
+            rate_limiter if rate_limiter is not None else get_rate_limiter("openrouter")
+        )
         self.system_prompt = """ROLE: US-Army Brigade Commander
 
 MISSION: From the multiple analyst JSON reports that follow, issue a single
@@ -59,6 +67,10 @@ RULES
         Returns:
             str: The textual response from the Gemini model, representing the Commander's
                 final ruling or synthesis of the analyses.
+
+        Raises:
+            RuntimeError: If the model returned no content. Errors from the API
+                call are raised once the rate limiter stops retrying them.
         """
         user_prompt = f"""Commander, the analyst reports follow (one JSON per line):
 
@@ -67,18 +79,30 @@ RULES
 Using only this information, deliver your decisive assessment in the required JSON
 schema."""
 
-        try:
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-            )
-            return completion.choices[0].message.content
-        except Exception as e:
-            print(f"Error during API call: {e}")
-            return "Error: Could not get a response from the commander model."
+        def request():
+            with span("commander.generate", model=self.model):
+                completion = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": self.system_prompt},
+                        {"role": "user", "content": user_prompt},
+                    ],
+                )
+            content = completion.choices[0].message.content
+            if not content:
+                raise RuntimeError("Commander model returned an empty response")
+            return content
+
+        def complete():
+            tokens = estimate_tokens(self.system_prompt + user_prompt)
+            return self.rate_limiter.call(request, tokens=tokens)
+
+        if self.response_cache is None:
+            return complete()
+        # Only successful responses reach the cache; errors are not recorded
+        return self.response_cache.fetch(
+            self.model, f"{self.system_prompt}\n{user_prompt}", complete
+        )
 
 
 def _parse_analyst_results(results: dict) -> str:
@@ -0,0 +1,433 @@
+import json
+import queue
+import threading
+import time
+
+from frame_store_handler import frame_digest
+from imagery_provider import frame_hash, hash_distance
+from tracing_handler import record_span, span, trace_context
+from utils_handler import make_base_id
+
+# Camera moves in the order they are guessed when the history gives no hint
+MOVES = ("zoom-in", "move-right", "move-left", "zoom-out")
+OPPOSITE_MOVES = {
+    "zoom-in": "zoom-out",
+    "zoom-out": "zoom-in",
+    "move-left": "move-right",
+    "move-right": "move-left",
+}
+
+
+def apply_action(latitude, longitude, distance_to_ground, action):
+    """Return the (latitude, longitude, distance_to_ground) after a camera move."""
+    match action:
+        case "zoom-in":
+            distance_to_ground -= 5000
+        case "zoom-out":
+            distance_to_ground += 5000
+        case "move-left":
+            longitude -= 0.01
+        case "move-right":
+            longitude += 0.01
+        case _:
+            raise RuntimeError(f"Unknown action: {action}")
+    return latitude, longitude, distance_to_ground
+
+
+class TeamSession:
+    """
+    The step-by-step state of one base's team analysis.
+
+    A session knows which view the next analyst should look at, applies each
+    analyst's requested action to the camera position, and turns the collected
+    reports into the final result once the commander has ruled. Keeping this
+    state outside of a single loop lets `team_analysis` run a base from start to
+    finish, while the pipeline interleaves the steps of many bases.
+
+    Every frame is perceptually hashed before it reaches the analyst. A frame
+    within `duplicate_distance` bits of one already analysed for the base, such
+    as a move past the edge of the imagery coverage, gets a "no new
+    information" report instead of an LLM call, which asks for a different
+    move. After `max_duplicates` such frames in a row the analysis ends.
+
+    With a CheckpointStore every completed step is checkpointed, and a session
+    created for a base with a checkpoint resumes after its last saved step,
+    replaying the saved reports into the analyst's prompt history.
+
+    Attributes:
+        base: The base dictionary from the CSV file.
+        analyst: The Analyst instance examining this base.
+        team_size: The maximum number of analyst steps.
+        analyses: Analyst reports collected so far, keyed "Analyst N".
+        finished: Whether no more analyst steps are needed.
+        frame_hashes: Perceptual hash of each analysed frame, keyed "Analyst N".
+        frame: Content hash of the current step's frame, stored in its report
+            as "frame_hash" so the frame can be found in a FrameStore.
+        llm_calls_saved: Analyst calls skipped for near-duplicate frames.
+        steps: One entry per completed step with the view, its screenshot
+            path and the analyst's report, as saved in the checkpoint.
+        checkpoints: The CheckpointStore saving each step, or None.
+    """
+
+    def __init__(
+        self,
+        base: dict,
+        analyst,
+        team_size: int = 8,
+        duplicate_distance: int = 5,
+        max_duplicates: int = 2,
+        checkpoints=None,
+    ):
+        self.base = base
+        self.analyst = analyst
+        self.team_size = team_size
+        self.latitude = float(base["latitude"])
+        self.longitude = float(base["longitude"])
+        self.base_id = f"{self.latitude}_{self.longitude}_{base['country']}"
+        self.distance_to_ground = 20000
+        self.step = 0
+        self.analyses = {}
+        self.finished = False
+        self.started_at = time.time()
+        self.duplicate_distance = duplicate_distance
+        self.max_duplicates = max_duplicates
+        self.frame_hashes = {}
+        self.llm_calls_saved = 0
+        self.consecutive_duplicates = 0
+        self.steps = []
+        self.checkpoints = checkpoints
+        self.frame = None
+
+        if checkpoints is not None:
+            state = checkpoints.load(make_base_id(base))
+            if state is not None:
+                self._resume(state)
+
+    def _resume(self, state: dict):
+        """Restore the session from a checkpoint saved by `record`."""
+        for entry in state["steps"]:
+            analysis = entry["analysis"]
+            self.analyses[entry["analyst"]] = analysis
+            if analysis["action"] != "finish":
+                # Rebuild the analyst's prompt history step by step
+                self.analyst.append_results(
+                    analyst_index=len(self.steps), results=analysis
+                )
+            self.steps.append(entry)
+
+        self.step = len(self.steps)
+        self.latitude = state["latitude"]
+        self.longitude = state["longitude"]
+        self.distance_to_ground = state["distance_to_ground"]
+        self.finished = state["finished"]
+        self.frame_hashes = state["frame_hashes"]
+        self.llm_calls_saved = state["llm_calls_saved"]
+        self.consecutive_duplicates = state["consecutive_duplicates"]
+        print(f"Resuming base {self.base_id} after {self.step} analyst steps")
+
+    def checkpoint(self) -> dict:
+        """Return the session state needed to resume after the current step."""
+        return {
+            "base": self.base,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "distance_to_ground": self.distance_to_ground,
+            "finished": self.finished,
+            "steps": self.steps,
+            "frame_hashes": self.frame_hashes,
+            "llm_calls_saved": self.llm_calls_saved,
+            "consecutive_duplicates": self.consecutive_duplicates,
+        }
+
+    def next_view(self) -> dict:
+        """Return the screenshot arguments for the next analyst step."""
+        return {
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "ground_distance": self.distance_to_ground,
+            "filename": f"{self.base_id}/analyst_{self.step+1}",
+        }
+
+    def candidate_views(self, limit: int = 2) -> list:
+        """
+        Guess the views the next analyst is most likely to request.
+
+        Moves this base's analysts already made rank first, most frequent and
+        then most recent first, followed by the remaining moves.
+
+        Returns:
+            list: Up to `limit` (latitude, longitude, ground_distance) tuples
+        """
+        history = [
+            analysis.get("action")
+            for analysis in self.analyses.values()
+            if analysis.get("action") in MOVES
+        ]
+        ranked = sorted(
+            MOVES,
+            key=lambda move: (
+                -history.count(move),
+                -max((i for i, a in enumerate(history) if a == move), default=-1),
+                MOVES.index(move),
+            ),
+        )
+        return [
+            apply_action(self.latitude, self.longitude, self.distance_to_ground, move)
+            for move in ranked[:limit]
+        ]
+
+    def capture(self, screenshot_handler):
+        """Capture the view for the current step with an ImageryProvider."""
+        with trace_context(base_id=self.base_id, analyst=self.step + 1):
+            screenshot = screenshot_handler.screenshot(**self.next_view())
+        self.frame = frame_digest(screenshot) if isinstance(screenshot, bytes) else None
+        return screenshot
+
+    def analyze(self, screenshot) -> dict:
+        """Have the analyst examine the screenshot for the current step."""
+        with trace_context(base_id=self.base_id, analyst=self.step + 1):
+            duplicate_of = self._find_duplicate(screenshot)
+            if duplicate_of is not None:
+                self.llm_calls_saved += 1
+                self.consecutive_duplicates += 1
+                print(f"Frame matches {duplicate_of}'s, skipping the analyst call")
+                return self._duplicate_report(duplicate_of)
+
+            self.consecutive_duplicates = 0
+            return self.analyst.analyze_image(image=screenshot)
+
+    def _find_duplicate(self, screenshot):
+        """
+        Hash the current frame and look for a near-identical earlier one.
+
+        Returns:
+            str: The label of the earliest matching analyst, or None
+        """
+        if self.duplicate_distance is None or not isinstance(screenshot, bytes):
+            return None
+
+        with span("frame.hash"):
+            current = frame_hash(screenshot)
+        current_label = f"Analyst {self.step+1}"
+        self.frame_hashes[current_label] = current
+        for label, previous in self.frame_hashes.items():
+            if label == current_label:
+                continue
+            if hash_distance(current, previous) <= self.duplicate_distance:
+                return label
+        return None
+
+    def _duplicate_report(self, duplicate_of: str) -> dict:
+        """Build the report that stands in for an analyst on a repeated frame."""
+        if self.consecutive_duplicates >= self.max_duplicates:
+            action = "finish"
+        else:
+            # Neither repeating the move nor undoing it leads anywhere new
+            last_action = self.analyses[f"Analyst {self.step}"]["action"]
+            action = next(
+                move
+                for move in MOVES
+                if move not in (last_action, OPPOSITE_MOVES.get(last_action))
+            )
+        return {
+            "findings": [],
+            "analysis": (
+                f"No new information: this view is nearly identical to the one "
+                f"{duplicate_of} already analyzed, so it was not re-analyzed."
+            ),
+            "things_to_continue_analyzing": [],
+            "action": action,
+            "duplicate_of": duplicate_of,
+        }
+
+    def record(self, screenshot_analysis: dict):
+        """
+        Store an analyst report and move the camera as the analyst requested.
+
+        Args:
+            screenshot_analysis: The JSON report returned by the analyst.
+        """
+        i = self.step
+        view = self.next_view()
+        if self.frame is not None:
+            screenshot_analysis["frame_hash"] = self.frame
+        self.analyses[f"Analyst {i+1}"] = screenshot_analysis
+        self.steps.append(
+            {
+                "analyst": f"Analyst {i+1}",
+                "latitude": view["latitude"],
+                "longitude": view["longitude"],
+                "ground_distance": view["ground_distance"],
+                "frame": f"./screenshots/{view['filename']}.jpeg",
+                "analysis": screenshot_analysis,
+            }
+        )
+        self.step += 1
+
+        print(f"command:{screenshot_analysis['action']}")
+        if screenshot_analysis["action"] == "finish":
+            self.finished = True
+        else:
+            self.latitude, self.longitude, self.distance_to_ground = apply_action(
+                self.latitude,
+                self.longitude,
+                self.distance_to_ground,
+                screenshot_analysis["action"],
+            )
+
+            self.analyst.append_results(analyst_index=i, results=screenshot_analysis)
+            if self.step >= self.team_size:
+                self.finished = True
+
+        if self.checkpoints is not None:
+            with span("checkpoint.save"):
+                self.checkpoints.save(make_base_id(self.base), self.checkpoint())
+
+    def conclude(self, commander) -> dict:
+        """
+        Ask the commander for a verdict and return the complete analyses.
+
+        Args:
+            commander: A Commander built from this session's analyses.
+        """
+        with trace_context(base_id=self.base_id):
+            verdict = commander.analyze()
+            self.analyses["Commander"] = json.loads(verdict.strip())
+            self.analyses["llm_calls_saved"] = self.llm_calls_saved
+            record_span(
+                "base.analysis",
+                self.started_at,
+                time.time() - self.started_at,
+                analysts=self.step,
+                llm_calls_saved=self.llm_calls_saved,
+            )
+        return self.analyses
+
+
+_STOP = object()
+
+
+def run_pipeline(
+    bases: list,
+    screenshot_pool,
+    make_analyst,
+    make_commander,
+    analysis_workers: int = 4,
+    max_in_flight: int = None,
+    team_size: int = 8,
+    checkpoints=None,
+):
+    """
+    Analyzes bases with browser capture and LLM analysis running side by side.
+
+    Every browser session in `screenshot_pool` gets a capture worker and
+    `analysis_workers` threads run the analyst and commander calls. A session
+    alternates between the two stages until it finishes, so while one base
+    waits on the LLM the browsers are capturing frames for other bases. At most
+    `max_in_flight` bases are admitted at once and every queue is bounded by
+    that number, so memory stays flat however many bases are processed.
+
+    Args:
+        bases: The bases to analyze.
+        screenshot_pool: A ScreenshotHandlerPool providing the browser sessions.
+        make_analyst: Callable returning a new Analyst for a base.
+        make_commander: Callable returning a Commander for a dict of analyses.
+        analysis_workers (int, optional): Number of concurrent LLM workers.
+            Defaults to 4.
+        max_in_flight (int, optional): Maximum number of bases being analyzed
+            at once. Defaults to the number of browser and LLM workers combined.
+        team_size (int, optional): The maximum number of analyst steps per base.
+            Defaults to 8.
+        checkpoints (CheckpointStore, optional): Saves every step and resumes
+            bases that have a checkpoint. Defaults to None.
+
+    Yields:
+        tuple: (base, result) for each finished base, in completion order. The
+            result is the analyses dictionary, or the exception that stopped
+            the base.
+    """
+    capture_workers = len(screenshot_pool.handlers)
+    if max_in_flight is None:
+        max_in_flight = capture_workers + analysis_workers
+
+    # A session sits in at most one queue at a time and admissions are capped
+    # at max_in_flight, so no put below can block forever
+    capture_queue = queue.Queue(maxsize=max_in_flight)
+    analysis_queue = queue.Queue(maxsize=max_in_flight)
+    result_queue = queue.Queue(maxsize=max_in_flight)
+    admissions = threading.BoundedSemaphore(max_in_flight)
+
+    def fail(session, error):
+        result_queue.put((session.base, error))
+
+    def feed():
+        for base in bases:
+            admissions.acquire()
+            try:
+                session = TeamSession(
+                    base,
+                    make_analyst(base),
+                    team_size=team_size,
+                    checkpoints=checkpoints,
+                )
+            except Exception as e:
+                result_queue.put((base, e))
+                continue
+            if session.finished:
+                # Resumed after its last step, only the commander is left
+                analysis_queue.put((session, None))
+            else:
+                capture_queue.put(session)
+
+    def capture():
+        with screenshot_pool.acquire() as screenshot_handler:
+            while (session := capture_queue.get()) is not _STOP:
+                try:
+                    screenshot = session.capture(screenshot_handler)
+                except Exception as e:
+                    fail(session, e)
+                    continue
+                analysis_queue.put((session, screenshot))
+
+    def analyze():
+        while (item := analysis_queue.get()) is not _STOP:
+            session, screenshot = item
+            try:
+                if not session.finished:
+                    session.record(session.analyze(screenshot))
+                if not session.finished:
+                    capture_queue.put(session)
+                    continue
+                commander = make_commander(session.analyses)
+                result_queue.put((session.base, session.conclude(commander)))
+            except Exception as e:
+                fail(session, e)
+
+    threads = [threading.Thread(target=feed, daemon=True)]
+    threads += [
+        threading.Thread(target=capture, daemon=True) for _ in range(capture_workers)
+    ]
+    threads += [
+        threading.Thread(target=analyze, daemon=True)
+        for _ in range(analysis_workers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        for _ in range(len(bases)):
+            base, result = result_queue.get()
+            admissions.release()
+            yield base, result
+    finally:
+        # Workers are daemon threads, so if the consumer bails out early with
+        # full queues they are simply left behind instead of blocking here
+        for stage_queue, worker_count in (
+            (capture_queue, capture_workers),
+            (analysis_queue, analysis_workers),
+        ):
+            for _ in range(worker_count):
+                try:
+                    stage_queue.put_nowait(_STOP)
+                except queue.Full:
+                    break
@@ -0,0 +1,279 @@
+import email.utils
+import random
+import threading
+import time
+from collections import deque
+
+from tracing_handler import record_span
+
+# Free-tier quotas of the models the analyzer uses by default
+PROVIDER_LIMITS = {
+    "gemini": {
+        "requests_per_minute": 15,
+        "tokens_per_minute": 1_000_000,
+        "max_concurrency": 4,
+    },
+    "openrouter": {
+        "requests_per_minute": 20,
+        "tokens_per_minute": None,
+        "max_concurrency": 2,
+    },
+}
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class SlidingWindow:
+    """
+    Thread-safe limit on the amount admitted in any window of `window` seconds.
+
+    Every admission is remembered until it leaves the window, so no stretch
+    of `window` seconds ever admits more than `limit`, however the requests
+    are spread.
+
+    Attributes:
+        limit: Maximum amount admitted per window.
+        window: Length of the window in seconds.
+    """
+
+    def __init__(self, limit: float, window: float = 60):
+        self.limit = limit
+        self.window = window
+        self._admitted = deque()
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        while self._admitted and self._admitted[0][0] <= now - self.window:
+            _, amount = self._admitted.popleft()
+            self._used -= amount
+
+    def acquire(self, amount: float = 1):
+        """Block until `amount` fits in the window, then admit it."""
+        # A request larger than the limit waits for an empty window instead
+        # of forever
+        amount = min(amount, self.limit)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._expire(now)
+                if self._used + amount <= self.limit:
+                    self._admitted.append((now, amount))
+                    self._used += amount
+                    return
+                # Wait until enough of the oldest admissions have expired
+                freed = self.limit - self._used
+                for admitted_at, admitted in self._admitted:
+                    freed += admitted
+                    if freed >= amount:
+                        break
+                wait = admitted_at + self.window - now
+            time.sleep(max(wait, 0.001))
+
+    def drain(self):
+        """Fill the window, e.g. after the provider reported a rate limit."""
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            if self._used < self.limit:
+                self._admitted.append((now, self.limit - self._used))
+                self._used = self.limit
+
+
+class RateLimiter:
+    """
+    Schedules the requests to one LLM provider within its quota.
+
+    Every request first waits for a concurrency slot and for room in the
+    provider's request-per-minute and token-per-minute sliding windows, so
+    workers sharing a limiter run at the quota ceiling without tripping it.
+    Failed requests are retried with jittered exponential backoff when the
+    error is transient (rate limits, server errors, dropped connections); a
+    Retry-After header from the provider overrides the backoff and pauses all
+    of the limiter's requests.
+    Time spent waiting is recorded as a `{name}.queue_wait` span, separately
+    from the model latency measured by the caller.
+
+    Attributes:
+        name: Provider name used in logs and span names.
+        max_retries: Retries after the first attempt before giving up.
+        requests: Requests sent to the provider, including retries.
+        retries: Requests that were retried.
+        throttled: Requests rejected by the provider's rate limit.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float,
+        tokens_per_minute: float = None,
+        max_concurrency: int = 4,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        self.name = name
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.request_window = SlidingWindow(requests_per_minute)
+        self.token_window = (
+            SlidingWindow(tokens_per_minute) if tokens_per_minute is not None else None
+        )
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.queue_wait = 0.0
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _wait_for_turn(self, tokens: int):
+        start = time.time()
+        start_counter = time.perf_counter()
+
+        while (pause := self._paused_until - time.monotonic()) > 0:
+            time.sleep(pause)
+        self.request_window.acquire()
+        if self.token_window is not None and tokens:
+            self.token_window.acquire(tokens)
+        self._slots.acquire()
+
+        waited = time.perf_counter() - start_counter
+        with self._lock:
+            self.queue_wait += waited
+        record_span(f"{self.name}.queue_wait", start, waited)
+
+    def call(self, request, tokens: int = 0):
+        """
+        Send a request once the quota allows it, retrying transient errors.
+
+        Args:
+            request: Callable performing the request and returning its result
+            tokens: Estimated tokens the request consumes
+
+        Returns:
+            The result of `request`
+
+        Raises:
+            Exception: The request's error if it is not transient or the
+                retries are exhausted
+        """
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_turn(tokens)
+            try:
+                with self._lock:
+                    self.requests += 1
+                return request()
+            except Exception as e:
+                status = _status_code(e)
+                if not _is_retryable(e, status) or attempt == self.max_retries:
+                    raise
+                error = e
+            finally:
+                self._slots.release()
+
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+            retry_after = _retry_after(error)
+            if status == 429:
+                with self._lock:
+                    self.throttled += 1
+                # Everyone shares the quota, so everyone backs off
+                self.request_window.drain()
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                    with self._lock:
+                        self._paused_until = max(
+                            self._paused_until, time.monotonic() + retry_after
+                        )
+            elif retry_after is not None:
+                delay = max(delay, retry_after)
+
+            with self._lock:
+                self.retries += 1
+            print(
+                f"{self.name} request failed ({status or type(error).__name__}), "
+                f"retry {attempt + 1}/{self.max_retries} in {delay:.1f}s"
+            )
+            time.sleep(delay)
+
+    def stats(self) -> dict:
+        """Return request, retry and queue-wait counters."""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "queue_wait_s": round(self.queue_wait, 3),
+            }
+
+
+def _status_code(error):
+    # openai errors carry `status_code`, google-genai errors carry `code`
+    for attribute in ("status_code", "code"):
+        status = getattr(error, attribute, None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def _is_retryable(error, status) -> bool:
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # Client libraries wrap httpx transport errors in their own classes
+    name = type(error).__name__
+    return "Connection" in name or "Timeout" in name
+
+
+def _retry_after(error):
+    """Seconds to wait according to the error's Retry-After header, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> RateLimiter:
+    """
+    Return the limiter shared by every client of a provider.
+
+    Limits come from PROVIDER_LIMITS; set them there or call
+    `configure_rate_limiter` before the first request to change them.
+    """
+    with _limiters_lock:
+        if provider not in _limiters:
+            _limiters[provider] = RateLimiter(provider, **PROVIDER_LIMITS[provider])
+        return _limiters[provider]
+
+
+def configure_rate_limiter(provider: str, **limits) -> RateLimiter:
+    """Replace a provider's shared limiter, e.g. for a paid-tier quota."""
+    with _limiters_lock:
+        _limiters[provider] = RateLimiter(
+            provider, **{**PROVIDER_LIMITS.get(provider, {}), **limits}
+        )
+        return _limiters[provider]
+
+
+def rate_limit_stats() -> dict:
+    """Return the stats of every limiter used so far, keyed by provider."""
+    with _limiters_lock:
+        return {name: limiter.stats() for name, limiter in _limiters.items()}
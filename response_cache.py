@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import threading
+
+RECORD = "record"
+REPLAY = "replay"
+PASSTHROUGH = "passthrough"
+
+
+class CacheMissError(RuntimeError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+class ResponseCache:
+    """
+    Persistent record/replay cache for LLM responses.
+
+    Responses are stored as one JSON file per request, named after the SHA-256
+    of the model name, the prompt and the image bytes. In "record" mode cached
+    responses are replayed and new ones are recorded; in "replay" mode a miss
+    raises CacheMissError instead of calling the model, which makes runs
+    deterministic and network-free; "passthrough" disables the cache.
+
+    Attributes:
+        directory: Folder holding the recorded responses.
+        mode: One of "record", "replay" or "passthrough".
+        hits: Number of requests answered from the cache.
+        misses: Number of requests not found in the cache.
+    """
+
+    def __init__(self, directory: str = "./cache/responses", mode: str = RECORD):
+        if mode not in (RECORD, REPLAY, PASSTHROUGH):
+            raise ValueError(f"Unknown response cache mode: {mode}")
+
+        self.directory = directory
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(model: str, prompt: str, image_bytes: bytes = b"") -> str:
+        """Return the cache key of a request."""
+        digest = hashlib.sha256()
+        for part in (model.encode("utf-8"), prompt.encode("utf-8"), image_bytes):
+            # Length-prefix every part so different splits never collide
+            digest.update(len(part).to_bytes(8, "big"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def fetch(self, model: str, prompt: str, call, image_bytes: bytes = b"") -> str:
+        """
+        Return the response for a request, calling the model only if needed.
+
+        Args:
+            model: Name of the model the request is sent to
+            prompt: Full text prompt of the request
+            call: Callable performing the real request and returning its text
+            image_bytes: Raw bytes of the image sent with the request, if any
+
+        Returns:
+            str: The recorded or freshly generated response text
+        """
+        if self.mode == PASSTHROUGH:
+            return call()
+
+        request_key = self.key(model, prompt, image_bytes)
+        path = os.path.join(self.directory, f"{request_key}.json")
+
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                response = json.load(f)["response"]
+            with self._lock:
+                self.hits += 1
+            return response
+
+        with self._lock:
+            self.misses += 1
+        if self.mode == REPLAY:
+            raise CacheMissError(
+                f"No recorded response for {model} request {request_key}"
+            )
+
+        response = call()
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"model": model, "response": response}, f)
+        os.replace(temp_path, path)
+        return response
+
+    def stats(self) -> dict:
+        """Return hit/miss counters."""
+        with self._lock:
+            return {"mode": self.mode, "hits": self.hits, "misses": self.misses}
+
+
+def image_bytes(image) -> bytes:
+    """
+    Return stable bytes identifying an image passed to a model.
+
+    Args:
+        image: Image data (PIL Image, bytes, or file path)
+    """
+    if image is None:
+        return b""
+    if isinstance(image, bytes):
+        return image
+    if isinstance(image, str):
+        with open(image, "rb") as f:
+            return f.read()
+    return f"{image.mode}:{image.size}:".encode("utf-8") + image.tobytes()
@@ -0,0 +1,769 @@
+"""
+Stores for the finished base analyses.
+
+Publishing data.json from a SQLite store, and reclaiming its free pages, is an
+explicit step rather than part of every run:
+
+Usage:
+    python results_handler.py --store data.db --vacuum
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from utils_handler import geohash, make_base_id
+
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+# Keys of the rows returned by the stores' `query`
+OVERVIEW_COLUMNS = (
+    "base_id",
+    "country",
+    "latitude",
+    "longitude",
+    "confidence_score",
+    "overall_assessment",
+)
+
+# Sort order of the confidence levels, most threatening first; any other
+# score, or none, sorts after them
+CONFIDENCE_ORDER = {"High": 0, "Medium": 1, "Low": 2}
+
+# Columns the stores' `query` can order by
+SORT_COLUMNS = ("country", "confidence_score", "latitude", "longitude")
+
+
+def open_result_store(path: str = "data.jsonl", **kwargs):
+    """
+    Open the result store for a path, picking the backend by file extension.
+
+    Args:
+        path: A .db, .sqlite or .sqlite3 file opens a SQLiteResultStore; any
+            other path a JSONL ResultStore
+        kwargs: Passed on to the store, e.g. read_only
+
+    Returns:
+        ResultStore or SQLiteResultStore: The opened store
+    """
+    if path.lower().endswith(SQLITE_EXTENSIONS):
+        return SQLiteResultStore(path, **kwargs)
+    return ResultStore(path, **kwargs)
+
+
+class ResultStore:
+    """
+    Append-only, crash-safe store for base analyses.
+
+    Every finished analysis is appended as one JSON line to a journal file and
+    fsynced, so saving a base costs one small write no matter how many bases
+    came before it. A crash can at worst leave a truncated last line, which is
+    dropped the next time the store is opened. `compact` rewrites the journal
+    without duplicates and publishes the classic data.json list atomically.
+    Writes take an exclusive lock on a `{path}.lock` file (on platforms with
+    fcntl), so several analyzer processes can share one journal.
+
+    Attributes:
+        path: Path of the JSONL journal.
+        snapshot_path: Path of the compacted JSON list read by older tools.
+        read_only: Skip importing data.json and repairing the journal on open.
+    """
+
+    def __init__(
+        self,
+        path: str = "data.jsonl",
+        snapshot_path: str = "data.json",
+        read_only: bool = False,
+    ):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.read_only = read_only
+
+        # Readers such as the dashboard must not touch a journal that an
+        # analyzer may be appending to
+        if read_only:
+            return
+        with self._locked():
+            if not os.path.exists(self.path) and os.path.exists(self.snapshot_path):
+                self._import_snapshot()
+            self._repair()
+
+    @contextmanager
+    def _locked(self):
+        """Hold the journal's write lock, shared with other processes."""
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _import_snapshot(self):
+        """Seed the journal from an existing data.json list."""
+        try:
+            with open(self.snapshot_path, "r") as f:
+                existing_analyses = json.load(f)
+        except json.JSONDecodeError:
+            print(f"Error loading {self.snapshot_path}, starting with empty analyses")
+            return
+
+        _atomic_write(
+            self.path,
+            "".join(json.dumps(analysis) + "\n" for analysis in existing_analyses),
+        )
+        print(f"Imported {len(existing_analyses)} analyses from {self.snapshot_path}")
+
+    def _repair(self):
+        """Drop a partially written last line left behind by a crash."""
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+
+            # Walk back to the end of the last complete line
+            position = size - 1
+            while position > 0:
+                step = min(4096, position)
+                f.seek(position - step)
+                chunk = f.read(step)
+                newline = chunk.rfind(b"\n")
+                if newline != -1:
+                    position = position - step + newline + 1
+                    break
+                position -= step
+            f.truncate(position)
+            print(f"Dropped an incomplete record at the end of {self.path}")
+
+    def append(self, analysis: dict):
+        """
+        Durably append one analysis to the journal.
+
+        Args:
+            analysis: The analysis result, including its 'base_info'.
+        """
+        line = json.dumps(analysis) + "\n"
+        with self._locked(), open(self.path, "a") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def __iter__(self):
+        """Stream the stored analyses one at a time, oldest first."""
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                for line_number, line in enumerate(f, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        print(f"Skipping corrupt record at {self.path}:{line_number}")
+        elif os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r") as f:
+                yield from json.load(f)
+
+    def analyzed_ids(self) -> set:
+        """Return the ids of every base that already has a stored analysis."""
+        return {make_base_id(analysis.get("base_info", {})) for analysis in self}
+
+    def load_all(self) -> list:
+        """Return every stored analysis, keeping only the latest one per base."""
+        latest = {}
+        for analysis in self:
+            base_id = make_base_id(analysis.get("base_info", {}))
+            latest.pop(base_id, None)
+            latest[base_id] = analysis
+        return list(latest.values())
+
+    def version(self):
+        """
+        Return a value that changes whenever the stored analyses change.
+
+        Returns:
+            tuple: Modification time and size of the journal, or of data.json
+                when there is no journal yet; None if neither exists
+        """
+        for path in (self.path, self.snapshot_path):
+            if os.path.exists(path):
+                stat = os.stat(path)
+                return path, stat.st_mtime_ns, stat.st_size
+        return None
+
+    def get(self, base_id: str):
+        """Return the latest analysis of a base, or None."""
+        found = None
+        for analysis in self:
+            if make_base_id(analysis.get("base_info", {})) == base_id:
+                found = analysis
+        return found
+
+    def query(
+        self,
+        country=None,
+        confidence=None,
+        bbox: tuple = None,
+        geohash_prefix: str = None,
+        order_by: str = None,
+        descending: bool = False,
+        limit: int = None,
+        offset: int = 0,
+    ) -> list:
+        """
+        Return an overview row of each base matching every given filter.
+
+        The journal is scanned in full; use a SQLiteResultStore for indexed
+        queries over many bases.
+
+        Args:
+            country: Country name, or a list of them; "Unknown" also matches
+                bases without one
+            confidence: Commander confidence score, e.g. "High", or a list of
+                them; "Unknown" also matches bases without one
+            bbox: (south, west, north, east) bounds in degrees
+            geohash_prefix: Geohash cell the bases must lie in
+            order_by: One of SORT_COLUMNS; confidence sorts from High to Low.
+                Bases are otherwise returned oldest first
+            descending: Reverse the sort order
+            limit: Maximum number of rows to return
+            offset: Number of matching rows to skip
+
+        Returns:
+            list: One dict per base with its base_id, country, latitude,
+                longitude, confidence_score and overall_assessment
+        """
+        matches = [
+            _overview_row(analysis)
+            for analysis in self.load_all()
+            if _matches(analysis, country, confidence, bbox, geohash_prefix)
+        ]
+        if order_by is not None:
+            matches.sort(key=_sort_key(order_by), reverse=descending)
+        end = None if limit is None else offset + limit
+        return matches[offset:end]
+
+    def count(
+        self,
+        country=None,
+        confidence=None,
+        bbox: tuple = None,
+        geohash_prefix: str = None,
+    ) -> int:
+        """Return the number of bases `query` matches with the same filters."""
+        return sum(
+            _matches(analysis, country, confidence, bbox, geohash_prefix)
+            for analysis in self.load_all()
+        )
+
+    def summary(self) -> dict:
+        """
+        Count the stored bases.
+
+        Returns:
+            dict: The number of bases in total ("bases"), per country
+                ("countries") and per commander confidence score ("confidence")
+        """
+        analyses = self.load_all()
+        countries = {}
+        confidence = {}
+        for analysis in analyses:
+            country, score = _country_and_confidence(analysis)
+            countries[country] = countries.get(country, 0) + 1
+            confidence[score] = confidence.get(score, 0) + 1
+        return {
+            "bases": len(analyses),
+            "countries": countries,
+            "confidence": confidence,
+        }
+
+    def compact(self):
+        """
+        Rewrite the journal without duplicates and publish data.json.
+
+        Both files are written to a temporary file first and moved into place,
+        so readers never see a half-written file.
+        """
+        # Appends from other processes wait, so none is lost in the rewrite
+        with self._locked():
+            analyses = self.load_all()
+            _atomic_write(
+                self.path,
+                "".join(json.dumps(analysis) + "\n" for analysis in analyses),
+            )
+            _atomic_write(self.snapshot_path, json.dumps(analyses, indent=4))
+        print(f"Compacted {len(analyses)} analyses into {self.snapshot_path}")
+
+
+def _atomic_write(path: str, content: str):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def _country_and_confidence(analysis: dict) -> tuple:
+    country = analysis.get("base_info", {}).get("country", "Unknown")
+    score = analysis.get("Commander", {}).get("confidence_score", "Unknown")
+    return country, score
+
+
+def _overview_row(analysis: dict) -> dict:
+    base_info = analysis.get("base_info", {})
+    verdict = analysis.get("Commander", {})
+    return {
+        "base_id": make_base_id(base_info),
+        "country": base_info.get("country"),
+        "latitude": base_info.get("latitude"),
+        "longitude": base_info.get("longitude"),
+        "confidence_score": verdict.get("confidence_score"),
+        "overall_assessment": verdict.get("overall_assessment"),
+    }
+
+
+def _sort_key(order_by: str):
+    if order_by not in SORT_COLUMNS:
+        raise ValueError(f"Cannot order bases by {order_by!r}")
+    if order_by == "country":
+        return lambda row: row["country"] or "Unknown"
+    if order_by == "confidence_score":
+        return lambda row: CONFIDENCE_ORDER.get(
+            row["confidence_score"], len(CONFIDENCE_ORDER)
+        )
+    return lambda row: float(row[order_by] or 0)
+
+
+def _one_of(value, wanted) -> bool:
+    if wanted is None:
+        return True
+    if isinstance(wanted, str):
+        wanted = [wanted]
+    return (value or "Unknown") in wanted
+
+
+def _matches(analysis: dict, country, confidence, bbox, geohash_prefix) -> bool:
+    analysis_country, score = _country_and_confidence(analysis)
+    if not _one_of(analysis_country, country):
+        return False
+    if not _one_of(score, confidence):
+        return False
+    if bbox is None and not geohash_prefix:
+        return True
+
+    base_info = analysis.get("base_info", {})
+    try:
+        latitude = float(base_info.get("latitude"))
+        longitude = float(base_info.get("longitude"))
+    except (TypeError, ValueError):
+        return False
+    if bbox is not None:
+        south, west, north, east = bbox
+        if not (south <= latitude <= north and west <= longitude <= east):
+            return False
+    if geohash_prefix:
+        return geohash(latitude, longitude).startswith(geohash_prefix)
+    return True
+
+
+class SQLiteResultStore:
+    """
+    Result store backed by SQLite, for dashboards and runs with many bases.
+
+    Offers the ResultStore interface plus indexed queries. Each analysis is
+    kept whole in the `bases` table, which also holds the base's country,
+    coordinates and geohash. The analyst steps go to `analyst_steps` and the
+    commander verdict to `verdicts`. Country, confidence score, geohash and
+    coordinates are indexed, so the analyzer's skip check and the dashboard's
+    filters, counts and lookups by base id do not scan every record. Storing a
+    base again replaces its previous analysis.
+
+    Attributes:
+        path: Path of the SQLite database.
+        snapshot_path: Path of the JSON list published by `publish_snapshot`
+            for older tools, and imported when the database is first created.
+        read_only: Open the database read-only, as the dashboard does.
+    """
+
+    def __init__(
+        self,
+        path: str = "data.db",
+        snapshot_path: str = "data.json",
+        read_only: bool = False,
+    ):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.read_only = read_only
+        self._local = threading.local()
+
+        if read_only:
+            return
+        is_new = not os.path.exists(path)
+        with self._connection() as connection:
+            connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS bases (
+                    base_id TEXT PRIMARY KEY,
+                    country TEXT,
+                    latitude REAL,
+                    longitude REAL,
+                    geohash TEXT,
+                    llm_calls_saved INTEGER,
+                    analysis TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS analyst_steps (
+                    base_id TEXT NOT NULL,
+                    step INTEGER NOT NULL,
+                    action TEXT,
+                    findings TEXT,
+                    analysis TEXT,
+                    things_to_continue_analyzing TEXT,
+                    PRIMARY KEY (base_id, step)
+                );
+                CREATE TABLE IF NOT EXISTS verdicts (
+                    base_id TEXT PRIMARY KEY,
+                    confidence_score TEXT,
+                    overall_assessment TEXT,
+                    key_confirmed_assets TEXT,
+                    unresolved_items TEXT,
+                    recommended_actions TEXT
+                );
+                CREATE INDEX IF NOT EXISTS bases_country ON bases (country);
+                CREATE INDEX IF NOT EXISTS bases_geohash ON bases (geohash);
+                CREATE INDEX IF NOT EXISTS bases_location
+                    ON bases (latitude, longitude);
+                CREATE INDEX IF NOT EXISTS verdicts_confidence
+                    ON verdicts (confidence_score);
+                """
+            )
+        if is_new and os.path.exists(snapshot_path):
+            self._import_snapshot()
+
+    def _connection(self) -> sqlite3.Connection:
+        # SQLite connections may not be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            if self.read_only:
+                uri = f"file:{os.path.abspath(self.path)}?mode=ro"
+                connection = sqlite3.connect(uri, uri=True, timeout=60)
+            else:
+                connection = sqlite3.connect(self.path, timeout=60)
+            self._local.connection = connection
+        return connection
+
+    def _import_snapshot(self):
+        """Seed the database from an existing data.json list."""
+        try:
+            with open(self.snapshot_path, "r") as f:
+                existing_analyses = json.load(f)
+        except json.JSONDecodeError:
+            print(f"Error loading {self.snapshot_path}, starting with empty analyses")
+            return
+        with self._connection() as connection:
+            for analysis in existing_analyses:
+                self._insert(connection, analysis)
+        print(f"Imported {len(existing_analyses)} analyses from {self.snapshot_path}")
+
+    def _insert(self, connection: sqlite3.Connection, analysis: dict):
+        base_info = analysis.get("base_info", {})
+        base_id = make_base_id(base_info)
+        try:
+            latitude = float(base_info["latitude"])
+            longitude = float(base_info["longitude"])
+            location_hash = geohash(latitude, longitude)
+        except (KeyError, TypeError, ValueError):
+            latitude = longitude = location_hash = None
+
+        # Replacing the row gives it a new rowid, so rows stay in the order
+        # their latest analysis was stored, as in the JSONL journal
+        connection.execute("DELETE FROM analyst_steps WHERE base_id = ?", (base_id,))
+        connection.execute(
+            "INSERT OR REPLACE INTO bases VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                base_id,
+                base_info.get("country"),
+                latitude,
+                longitude,
+                location_hash,
+                analysis.get("llm_calls_saved"),
+                json.dumps(analysis),
+            ),
+        )
+        for key, report in analysis.items():
+            if not key.startswith("Analyst ") or not isinstance(report, dict):
+                continue
+            connection.execute(
+                "INSERT INTO analyst_steps VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    base_id,
+                    int(key.split(" ")[-1]),
+                    report.get("action"),
+                    json.dumps(report.get("findings", [])),
+                    report.get("analysis"),
+                    json.dumps(report.get("things_to_continue_analyzing", [])),
+                ),
+            )
+        verdict = analysis.get("Commander", {})
+        connection.execute(
+            "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                base_id,
+                verdict.get("confidence_score"),
+                verdict.get("overall_assessment"),
+                json.dumps(verdict.get("key_confirmed_assets", [])),
+                json.dumps(verdict.get("unresolved_items", [])),
+                json.dumps(verdict.get("recommended_actions", [])),
+            ),
+        )
+
+    def append(self, analysis: dict):
+        """
+        Durably store one analysis, replacing any earlier one for its base.
+
+        Args:
+            analysis: The analysis result, including its 'base_info'.
+        """
+        with self._connection() as connection:
+            self._insert(connection, analysis)
+
+    def __iter__(self):
+        """Stream the stored analyses one at a time, oldest first."""
+        cursor = self._connection().execute(
+            "SELECT analysis FROM bases ORDER BY rowid"
+        )
+        for (analysis,) in cursor:
+            yield json.loads(analysis)
+
+    def analyzed_ids(self) -> set:
+        """Return the ids of every base that already has a stored analysis."""
+        rows = self._connection().execute("SELECT base_id FROM bases")
+        return {base_id for (base_id,) in rows}
+
+    def load_all(self) -> list:
+        """Return every stored analysis."""
+        return list(self)
+
+    def version(self):
+        """
+        Return a value that changes whenever the stored analyses change.
+
+        Returns:
+            tuple: Modification time and size of the database file, or None
+                if it does not exist
+        """
+        if not os.path.exists(self.path):
+            return None
+        stat = os.stat(self.path)
+        return self.path, stat.st_mtime_ns, stat.st_size
+
+    def get(self, base_id: str):
+        """Return the analysis of a base, or None."""
+        row = (
+            self._connection()
+            .execute("SELECT analysis FROM bases WHERE base_id = ?", (base_id,))
+            .fetchone()
+        )
+        return json.loads(row[0]) if row is not None else None
+
+    def query(
+        self,
+        country=None,
+        confidence=None,
+        bbox: tuple = None,
+        geohash_prefix: str = None,
+        order_by: str = None,
+        descending: bool = False,
+        limit: int = None,
+        offset: int = 0,
+    ) -> list:
+        """
+        Return an overview row of each base matching every given filter.
+
+        Only the indexed columns and the verdict's assessment are read; full
+        analyses are loaded one at a time with `get`.
+
+        Args:
+            country: Country name, or a list of them; "Unknown" also matches
+                bases without one
+            confidence: Commander confidence score, e.g. "High", or a list of
+                them; "Unknown" also matches bases without one
+            bbox: (south, west, north, east) bounds in degrees
+            geohash_prefix: Geohash cell the bases must lie in
+            order_by: One of SORT_COLUMNS; confidence sorts from High to Low.
+                Bases are otherwise returned oldest first
+            descending: Reverse the sort order
+            limit: Maximum number of rows to return
+            offset: Number of matching rows to skip
+
+        Returns:
+            list: One dict per base with its base_id, country, latitude,
+                longitude, confidence_score and overall_assessment
+        """
+        where, parameters = _where(country, confidence, bbox, geohash_prefix)
+        order = "bases.rowid"
+        if order_by is not None:
+            if order_by not in SORT_COLUMNS:
+                raise ValueError(f"Cannot order bases by {order_by!r}")
+            direction = " DESC" if descending else ""
+            order = f"{_SORT_EXPRESSIONS[order_by]}{direction}, {order}"
+        sql = (
+            "SELECT bases.base_id, bases.country, bases.latitude, bases.longitude, "
+            "verdicts.confidence_score, verdicts.overall_assessment FROM bases "
+            "LEFT JOIN verdicts ON verdicts.base_id = bases.base_id"
+            f"{where} ORDER BY {order}"
+        )
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            parameters += [-1 if limit is None else limit, offset]
+        rows = self._connection().execute(sql, parameters)
+        return [dict(zip(OVERVIEW_COLUMNS, row)) for row in rows]
+
+    def count(
+        self,
+        country=None,
+        confidence=None,
+        bbox: tuple = None,
+        geohash_prefix: str = None,
+    ) -> int:
+        """Return the number of bases `query` matches with the same filters."""
+        where, parameters = _where(country, confidence, bbox, geohash_prefix)
+        (total,) = self._connection().execute(
+            "SELECT COUNT(*) FROM bases "
+            "LEFT JOIN verdicts ON verdicts.base_id = bases.base_id"
+            f"{where}",
+            parameters,
+        ).fetchone()
+        return total
+
+    def summary(self) -> dict:
+        """
+        Count the stored bases.
+
+        Returns:
+            dict: The number of bases in total ("bases"), per country
+                ("countries") and per commander confidence score ("confidence")
+        """
+        connection = self._connection()
+        (total,) = connection.execute("SELECT COUNT(*) FROM bases").fetchone()
+        countries = connection.execute(
+            "SELECT COALESCE(country, 'Unknown'), COUNT(*) FROM bases GROUP BY country"
+        ).fetchall()
+        confidence = connection.execute(
+            "SELECT COALESCE(confidence_score, 'Unknown'), COUNT(*) FROM verdicts "
+            "GROUP BY confidence_score"
+        ).fetchall()
+        return {
+            "bases": total,
+            "countries": dict(countries),
+            "confidence": dict(confidence),
+        }
+
+    def compact(self):
+        """
+        Nothing to do at the end of a run.
+
+        Storing a base already replaces its previous analysis. Exporting
+        data.json and reclaiming free pages cost a pass over every result and
+        an exclusive lock, so they are left to `publish_snapshot`.
+        """
+
+    def publish_snapshot(self, vacuum: bool = False):
+        """
+        Publish data.json for older tools, optionally reclaiming free pages.
+
+        The snapshot is written to a temporary file first and moved into place,
+        so readers never see a half-written file. VACUUM locks the database
+        exclusively, so only run it while no analyzer is writing.
+
+        Args:
+            vacuum: Also rebuild the database file without its free pages
+        """
+        analyses = self.load_all()
+        _atomic_write(self.snapshot_path, json.dumps(analyses, indent=4))
+        print(f"Published {len(analyses)} analyses to {self.snapshot_path}")
+        if vacuum:
+            self._connection().execute("VACUUM")
+            print(f"Vacuumed {self.path}")
+
+
+_SORT_EXPRESSIONS = {
+    "country": "COALESCE(bases.country, 'Unknown')",
+    "confidence_score": (
+        "CASE verdicts.confidence_score "
+        + "".join(
+            f"WHEN '{level}' THEN {rank} "
+            for level, rank in CONFIDENCE_ORDER.items()
+        )
+        + f"ELSE {len(CONFIDENCE_ORDER)} END"
+    ),
+    "latitude": "COALESCE(bases.latitude, 0)",
+    "longitude": "COALESCE(bases.longitude, 0)",
+}
+
+
+def _one_of_condition(column, wanted, conditions, parameters):
+    if wanted is None:
+        return
+    if isinstance(wanted, str):
+        wanted = [wanted]
+    condition = f"{column} IN ({', '.join('?' * len(wanted))})"
+    if "Unknown" in wanted:
+        condition = f"({condition} OR {column} IS NULL)"
+    conditions.append(condition)
+    parameters += wanted
+
+
+def _where(country, confidence, bbox, geohash_prefix) -> tuple:
+    conditions = []
+    parameters = []
+    _one_of_condition("bases.country", country, conditions, parameters)
+    _one_of_condition(
+        "verdicts.confidence_score", confidence, conditions, parameters
+    )
+    if bbox is not None:
+        south, west, north, east = bbox
+        conditions.append("bases.latitude BETWEEN ? AND ?")
+        conditions.append("bases.longitude BETWEEN ? AND ?")
+        parameters += [south, north, west, east]
+    if geohash_prefix:
+        # A range instead of LIKE, so the geohash index is used
+        conditions.append("bases.geohash >= ? AND bases.geohash < ?")
+        parameters += [geohash_prefix, geohash_prefix + "~"]
+    if not conditions:
+        return "", parameters
+    return " WHERE " + " AND ".join(conditions), parameters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish data.json from a store")
+    parser.add_argument("--store", default=os.environ.get("RESULT_STORE", "data.db"))
+    parser.add_argument("--snapshot", default="data.json")
+    parser.add_argument("--vacuum", action="store_true")
+    args = parser.parse_args()
+
+    store = open_result_store(args.store, snapshot_path=args.snapshot)
+    if isinstance(store, SQLiteResultStore):
+        store.publish_snapshot(vacuum=args.vacuum)
+    else:
+        store.compact()
+
+
+if __name__ == "__main__":
+    main()
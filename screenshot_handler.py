@@ -1,47 +1,211 @@
+import base64
 import os
+import queue
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from io import BytesIO
 
-from PIL import Image
-from selenium import webdriver
-from selenium.common.exceptions import TimeoutException
-from selenium.webdriver import ChromeOptions
+from PIL import Image, ImageChops, ImageStat
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.support.ui import WebDriverWait
 
+from browser_handler import BrowserManager
+from imagery_provider import IMAGE_SIZE, ImageryProvider, view_width
+from frame_store_handler import save_frame
+from tracing_handler import span
 
-class ScreenshotHandler:
-    def __init__(self, options=None):
+# Viewport height in device pixels of the default 1600x1200 window, for which a
+# 1024 pixel frame covers `view_width` meters
+REFERENCE_VIEWPORT_HEIGHT = 1200
+
+
+class ScreenshotHandler(ImageryProvider):
+    def __init__(
+        self,
+        options=None,
+        render_timeout: float = 20,
+        render_poll_interval: float = 0.5,
+        render_stable_frames: int = 2,
+        render_diff_threshold: float = 1.0,
+        cache=None,
+        browser_settings: dict = None,
+    ):
         """
         Initialize the screenshot handler with optional Chrome options.
 
         Args:
-            options: Optional Chrome options for the WebDriver
+            options: Optional Chrome options for the WebDriver; by default a
+                headless, GPU-less session with a persistent profile is used
+            render_timeout: Maximum time in seconds to wait for the view to settle
+            render_poll_interval: Delay in seconds between readiness checks
+            render_stable_frames: Consecutive unchanged checks needed to consider
+                the view rendered
+            render_diff_threshold: Mean per-pixel difference (0-255) below which
+                two consecutive frames count as unchanged
+            cache: Optional ImageryCache consulted before navigating the browser
+            browser_settings: Optional BrowserManager keyword arguments, e.g.
+                max_captures or navigation_timeout
         """
-        chrome_options = ChromeOptions() if options is None else options
+        self.render_timeout = render_timeout
+        self.render_poll_interval = render_poll_interval
+        self.render_stable_frames = render_stable_frames
+        self.render_diff_threshold = render_diff_threshold
+        self.cache = cache
+        # Screenshots are written to disk off the capture path
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        self._spare_tabs = []
+        self._speculated = set()
+        self._speculation_lock = threading.Lock()
+        self.prefetched = 0
+        self.prefetch_used = 0
 
-        self.driver = webdriver.Chrome(options=chrome_options)
+        self.browser = BrowserManager(options=options, **(browser_settings or {}))
 
         # Create screenshots directory if it doesn't exist
         os.makedirs("screenshots", exist_ok=True)
 
-    def __wait_for_page_load(self, timeout=10):
+    @property
+    def driver(self):
+        """The current WebDriver; it changes whenever the browser is recycled."""
+        return self.browser.driver
+
+    def __wait_for_page_load(self, timeout=10, should_stop=None):
         """
         Wait for page to load completely.
 
         Args:
             timeout: Maximum time to wait in seconds
+            should_stop: Callable returning True to abandon the wait
 
         Returns:
             bool: True if page loaded successfully, False if timeout occurred
+                or `should_stop` abandoned the wait
         """
+
+        def stopped():
+            return should_stop is not None and should_stop()
+
         try:
             WebDriverWait(self.driver, timeout).until(
-                lambda d: d.execute_script("return document.readyState") == "complete"
+                lambda d: stopped()
+                or d.execute_script("return document.readyState") == "complete"
             )
-            return True
         except TimeoutException:
             print("Timeout waiting for page to load")
             return False
+        return not stopped()
+
+    def __viewport(self):
+        """Return the viewport's CSS width, height and device pixel ratio."""
+        return self.driver.execute_script(
+            "return [window.innerWidth, window.innerHeight, window.devicePixelRatio]"
+        )
+
+    def __capture_clip(self, x, y, width, height, scale=1, quality=95):
+        """
+        Capture a region of the viewport as JPEG through the DevTools protocol.
+
+        The browser encodes only the clipped region, so no full-window PNG has
+        to be transferred, decoded, cropped and re-encoded.
+
+        Args:
+            x, y, width, height: The region in CSS pixels
+            scale: Scale factor applied to the region
+            quality: JPEG quality (0-100)
+
+        Returns:
+            bytes: The encoded JPEG
+        """
+        result = self.driver.execute_cdp_cmd(
+            "Page.captureScreenshot",
+            {
+                "format": "jpeg",
+                "quality": quality,
+                "clip": {
+                    "x": x,
+                    "y": y,
+                    "width": width,
+                    "height": height,
+                    "scale": scale,
+                },
+            },
+        )
+        return base64.b64decode(result["data"])
+
+    def __wait_for_render(self, viewport_width, viewport_height, should_stop=None):
+        """
+        Wait until the viewport stops changing.
+
+        The view counts as rendered once `render_stable_frames` consecutive
+        checks see both a near-identical 64 pixel wide thumbnail of the
+        viewport and no new network resources. The resource timing buffer is
+        cleared at every check, so its 250 entry limit never hides new
+        requests. Gives up after `render_timeout` seconds.
+
+        Returns:
+            bool: False if `should_stop` asked to abandon the wait, else True
+        """
+        start = time.monotonic()
+        previous_frame = None
+        stable_checks = 0
+        thumbnail_scale = 64 / max(viewport_width, viewport_height)
+
+        while True:
+            if should_stop is not None and should_stop():
+                return False
+            thumbnail = self.__capture_clip(
+                0,
+                0,
+                viewport_width,
+                viewport_height,
+                scale=thumbnail_scale,
+                quality=50,
+            )
+            new_resources = self.driver.execute_script(
+                "const count = performance.getEntriesByType('resource').length;"
+                "performance.clearResourceTimings();"
+                "return count"
+            )
+            frame = Image.open(BytesIO(thumbnail)).convert("L").resize((64, 64))
+
+            if previous_frame is not None:
+                difference = ImageStat.Stat(
+                    ImageChops.difference(frame, previous_frame)
+                )
+                if (
+                    difference.mean[0] < self.render_diff_threshold
+                    and new_resources == 0
+                ):
+                    stable_checks += 1
+                else:
+                    stable_checks = 0
+
+            elapsed = time.monotonic() - start
+            if stable_checks >= self.render_stable_frames:
+                print(f"View rendered after {elapsed:.2f}s")
+                return True
+            if elapsed >= self.render_timeout:
+                print(f"Timeout waiting for view to render after {elapsed:.2f}s")
+                return True
+
+            previous_frame = frame
+            time.sleep(self.render_poll_interval)
+
+    def __write(self, jpeg_data, output_file_path, cache_view=None):
+        """Write a screenshot and its previews in the background, then cache it."""
+
+        def write():
+            save_frame(jpeg_data, output_file_path)
+            if cache_view is not None:
+                self.cache.put_bytes(*cache_view[:3], jpeg_data, cache_view[3])
+
+        def report(future):
+            if future.exception() is not None:
+                print(f"Error saving {output_file_path}: {future.exception()}")
+
+        self._writer.submit(write).add_done_callback(report)
 
     def screenshot(
         self,
@@ -50,6 +214,7 @@ class ScreenshotHandler:
         filename: str,
         ground_distance: int = 0,
         output_file_path: str = None,
+        image_size: int = IMAGE_SIZE,
     ):
         """
         Takes a screenshot of Google Earth at the specified coordinates.
@@ -57,52 +222,286 @@ class ScreenshotHandler:
         Args:
             latitude: Location latitude
             longitude: Location longitude
+            filename: Screenshot name, relative to ./screenshots, without extension
+            ground_distance: Camera distance from the ground in meters
             output_file_path: Optional custom file path for the screenshot
+            image_size: Size of the centre crop in pixels; the browser window
+                must be large enough to contain it
 
         Returns:
-            PIL.Image: The cropped image if successful, None otherwise
+            bytes: The JPEG-encoded centre crop if successful, None otherwise
         """
-
-        image_width = 1024
-        image_height = 1024
-
         if output_file_path is None:
             output_file_path = f"./screenshots/{filename}.jpeg"
 
-        google_earth_url = f"https://earth.google.com/web/@{latitude},{longitude},0a,{ground_distance}d"
-        self.driver.get(google_earth_url)
-
-        is_page_ready = self.__wait_for_page_load()
-        if is_page_ready is not False:
-            # Take screenshot - waiting a bit for Google Earth to load the coordinates
-            time.sleep(5)
-            # Get screenshot as PNG bytes
-            png_data = self.driver.get_screenshot_as_png()
-
-            # Convert PNG to JPEG using PIL
-            img = Image.open(BytesIO(png_data))
-            # Get dimensions of the full screenshot
-            full_width, full_height = img.size
-
-            # Calculate coordinates for center crop
-            left = (full_width - image_width) // 2
-            top = (full_height - image_height) // 2
-            right = left + image_width
-            bottom = top + image_height
-
-            # Crop the image
-            cropped_img = img.crop((left, top, right, bottom))
-
-            # Convert to RGB and save
-            cropped_img = cropped_img.convert("RGB")  # Remove alpha for JPEG
-            cropped_img.save(output_file_path, "JPEG", quality=95)
-            print(f"Screenshot saved to {output_file_path}")
-            return cropped_img
-        else:
+        cache = self.cache
+        cache_view = _cache_view(latitude, longitude, ground_distance, image_size)
+
+        if cache is not None:
+            with span("screenshot.cache_lookup"):
+                cached_path = cache.get(*cache_view)
+            jpeg_data = None
+            if cached_path is not None:
+                try:
+                    with open(cached_path, "rb") as f:
+                        jpeg_data = f.read()
+                except FileNotFoundError:
+                    # Evicted by another process since the lookup
+                    pass
+            if jpeg_data is not None:
+                # Cache hit - skip the browser navigation entirely
+                with self._speculation_lock:
+                    cache_key = cache.key(*cache_view)
+                    if cache_key in self._speculated:
+                        self._speculated.discard(cache_key)
+                        self.prefetch_used += 1
+                self.__write(jpeg_data, output_file_path)
+                print(f"Screenshot served from cache to {output_file_path}")
+                return jpeg_data
+
+        google_earth_url = _google_earth_url(latitude, longitude, ground_distance)
+
+        # A wedged session is killed by the watchdog and the capture retried
+        # once on a fresh browser, so the base's progress is kept
+        for attempt in range(2):
+            try:
+                with self.browser.watchdog():
+                    jpeg_data = self.__capture(google_earth_url, image_size)
+                break
+            except Exception as e:
+                # A killed session surfaces as a connection error rather than
+                # a WebDriverException
+                recoverable = self.browser.killed or isinstance(e, WebDriverException)
+                if attempt == 1 or not recoverable:
+                    raise
+                reason = "watchdog timeout" if self.browser.killed else str(e)
+                self.browser.restart(reason.splitlines()[0])
+
+        if jpeg_data is None:
             print(
                 f"Error loading google earth for coordinates: lat:{latitude},long:{longitude}"
             )
+            return None
+
+        self.__write(
+            jpeg_data, output_file_path, cache_view if cache is not None else None
+        )
+        print(f"Screenshot saved to {output_file_path}")
+        self.browser.record_capture()
+        return jpeg_data
+
+    def __capture(self, google_earth_url, image_size):
+        """
+        Navigate to a Google Earth view and capture its centre once rendered.
+
+        Returns:
+            bytes: The JPEG-encoded centre crop, or None if the page did not load
+        """
+        with span("screenshot.navigate"):
+            self.driver.get(google_earth_url)
+        return self.__capture_current(image_size)
+
+    def __capture_current(self, image_size, should_stop=None):
+        """
+        Capture the centre of the current tab once it has rendered.
+
+        Returns:
+            bytes: The JPEG-encoded centre crop, or None if the page did not
+                load or `should_stop` abandoned the wait
+        """
+        with span("screenshot.page_load"):
+            is_page_ready = self.__wait_for_page_load(should_stop=should_stop)
+
+        if is_page_ready is False:
+            return None
+
+        viewport_width, viewport_height, pixel_ratio = self.__viewport()
+
+        # Wait for Google Earth to finish rendering the coordinates
+        with span("screenshot.render_wait"):
+            if not self.__wait_for_render(
+                viewport_width, viewport_height, should_stop
+            ):
+                return None
+
+        # Calculate the centre crop in CSS pixels; the browser renders it
+        # at the device pixel ratio, giving image_size x image_size
+        clip_width = image_size / pixel_ratio
+        clip_height = image_size / pixel_ratio
+        left = (viewport_width - clip_width) / 2
+        top = (viewport_height - clip_height) / 2
+
+        with span("screenshot.capture"):
+            return self.__capture_clip(left, top, clip_width, clip_height)
+
+    def meters_per_pixel(self, ground_distance: float) -> float:
+        """
+        Ground resolution of this browser's frames at `ground_distance`.
+
+        Google Earth fixes the vertical field of view, so the viewport's height
+        spans the same ground whatever the window size; a taller window shows
+        it at a proportionally finer resolution.
+        """
+        _, viewport_height, pixel_ratio = self.__viewport()
+        scale = REFERENCE_VIEWPORT_HEIGHT / (viewport_height * pixel_ratio)
+        return view_width(ground_distance) / IMAGE_SIZE * scale
+
+    def prefetch(self, views, should_stop=None, max_tabs: int = 2):
+        """
+        Speculatively capture likely next views into the cache.
+
+        Each view is loaded in its own spare tab so the tiles of all views
+        download in parallel, then captured in order of likelihood until
+        `should_stop` returns True. Meant to run on a background thread while
+        no other call uses the driver, e.g. during an analyst LLM call.
+
+        Args:
+            views: (latitude, longitude, ground_distance) tuples, most likely
+                first, optionally followed by the frame size in pixels
+            should_stop: Callable returning True once the result is needed
+            max_tabs: Maximum number of views loaded at once
+        """
+        if self.cache is None:
+            return
+        views = [_cache_view(*view) for view in views]
+        views = [view for view in views if not self.cache.contains(*view)]
+        views = views[:max_tabs]
+        if not views:
+            return
+
+        main_tab = self.driver.current_window_handle
+        open_tabs = set(self.driver.window_handles)
+        self._spare_tabs = [tab for tab in self._spare_tabs if tab in open_tabs]
+        try:
+            with self.browser.watchdog():
+                while len(self._spare_tabs) < len(views):
+                    self.driver.switch_to.new_window("tab")
+                    self._spare_tabs.append(self.driver.current_window_handle)
+
+                # Start every navigation before waiting on any of them
+                for tab, view in zip(self._spare_tabs, views):
+                    self.driver.switch_to.window(tab)
+                    self.driver.execute_script(
+                        "window.location.href = arguments[0]",
+                        _google_earth_url(*view[:3]),
+                    )
+
+                for tab, view in zip(self._spare_tabs, views):
+                    if should_stop is not None and should_stop():
+                        break
+                    self.driver.switch_to.window(tab)
+                    image_size = view[3] or IMAGE_SIZE
+                    jpeg_data = self.__capture_current(image_size, should_stop)
+                    if jpeg_data is None:
+                        continue
+                    self.cache.put_bytes(*view[:3], jpeg_data, view[3])
+                    with self._speculation_lock:
+                        self._speculated.add(self.cache.key(*view))
+                        self.prefetched += 1
+        except Exception as e:
+            # Speculation must never fail the base; the next real capture
+            # restarts the browser if the session was lost
+            print(f"Prefetch abandoned: {str(e).splitlines()[0] if str(e) else e}")
+        finally:
+            try:
+                self.driver.switch_to.window(main_tab)
+            except Exception:
+                pass
+
+    @contextmanager
+    def speculating(self, views, max_tabs: int = 2):
+        """
+        Prefetch `views` in the background for the duration of the block.
+
+        On exit any capture still in progress is abandoned at its next
+        page-load or render poll, so the driver is free again for the real
+        capture within one poll interval.
+        """
+        stop = threading.Event()
+        worker = threading.Thread(
+            target=self.prefetch,
+            args=(views, stop.is_set, max_tabs),
+            daemon=True,
+        )
+        worker.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            worker.join()
+
+    def prefetch_stats(self) -> dict:
+        """Return how many speculative captures were later used."""
+        with self._speculation_lock:
+            return {
+                "prefetched": self.prefetched,
+                "used": self.prefetch_used,
+                "hit_rate": (
+                    self.prefetch_used / self.prefetched if self.prefetched else 0.0
+                ),
+            }
 
     def quit(self):
         """Close the browser and release resources when done"""
-        self.driver.quit()
+        self._writer.shutdown(wait=True)
+        self.browser.quit()
+
+
+def _google_earth_url(latitude, longitude, ground_distance):
+    return f"https://earth.google.com/web/@{latitude},{longitude},0a,{ground_distance}d"
+
+
+def _cache_view(latitude, longitude, ground_distance, image_size=IMAGE_SIZE):
+    """Return the ImageryCache arguments for a view; only odd sizes are keyed."""
+    size_key = None if image_size == IMAGE_SIZE else image_size
+    return latitude, longitude, ground_distance, size_key
+
+
+class ScreenshotHandlerPool:
+    """
+    A fixed-size pool of ScreenshotHandler browser sessions.
+
+    Each WebDriver session can only serve one caller at a time, so concurrent
+    workers borrow a handler from the pool for the duration of a base analysis
+    and return it when done. Any other ImageryProvider can be pooled the same
+    way by passing a `provider_factory`.
+    """
+
+    def __init__(
+        self, size: int = 1, options=None, cache=None, provider_factory=None
+    ):
+        """
+        Start `size` browser sessions.
+
+        Args:
+            size: Number of ScreenshotHandler instances to keep in the pool
+            options: Optional Chrome options passed to every handler
+            cache: Optional ImageryCache shared by every handler
+            provider_factory: Optional callable returning a new ImageryProvider,
+                used instead of starting Chrome sessions
+        """
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+
+        if provider_factory is None:
+            def provider_factory():
+                return ScreenshotHandler(options=options, cache=cache)
+
+        self.handlers = [provider_factory() for _ in range(size)]
+        self._available = queue.Queue()
+        for handler in self.handlers:
+            self._available.put(handler)
+
+    @contextmanager
+    def acquire(self):
+        """Borrow a handler from the pool, blocking until one is free."""
+        handler = self._available.get()
+        try:
+            yield handler
+        finally:
+            self._available.put(handler)
+
+    def quit(self):
+        """Close every browser session in the pool"""
+        for handler in self.handlers:
+            handler.quit()
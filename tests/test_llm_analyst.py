@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip("google.genai")
+
+from llm_analyst import PromptHistory, estimate_tokens  # noqa: E402
+
+
+def _step(index, items, analysis_length=40):
+    return index, {
+        "analysis": f"analysis {index} " + "x" * analysis_length,
+        "things_to_continue_analyzing": items,
+    }
+
+
+def test_short_history_is_kept_in_full():
+    history = PromptHistory(token_budget=1000, keep_recent=2)
+    history.add(*_step(1, ["hangar"]))
+    history.add(*_step(2, ["runway"]))
+
+    text = history.render()
+
+    assert "analysis 1" in text and "analysis 2" in text
+    assert "earlier_analysts" not in text
+
+
+def test_older_steps_are_compacted_to_outstanding_items():
+    history = PromptHistory(token_budget=1000, keep_recent=2)
+    history.add(*_step(1, ["hangar", "None"]))
+    history.add(*_step(2, ["fuel depot"]))
+    history.add(*_step(3, ["runway"]))
+    history.add(*_step(4, ["Fuel depot"]))
+
+    text = history.render()
+
+    assert "analysis 1" not in text and "analysis 2" not in text
+    assert "analysis 3" in text and "analysis 4" in text
+    # Items repeated by a recent step and "none" placeholders are dropped
+    assert "['hangar']" in text
+
+
+def test_history_stays_within_budget():
+    history = PromptHistory(token_budget=150, keep_recent=2)
+    for index in range(1, 30):
+        history.add(*_step(index, [f"item {index}", f"other {index}"]))
+
+    text = history.render()
+
+    assert estimate_tokens(text) <= history.token_budget
+    assert "analysis 29" in text
+
+
+def test_budget_drops_oldest_outstanding_items_first():
+    history = PromptHistory(token_budget=60, keep_recent=1)
+    for index in range(1, 20):
+        history.add(*_step(index, [f"item {index}"], analysis_length=10))
+
+    text = history.render()
+
+    assert estimate_tokens(text) <= history.token_budget
+    assert "item 18" in text
+    assert "'item 1'" not in text
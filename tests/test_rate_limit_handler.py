@@ -0,0 +1,107 @@
+import pytest
+
+import rate_limit_handler
+from rate_limit_handler import RateLimiter, SlidingWindow
+
+
+class FakeClock:
+    """Monotonic clock that only advances when the code under test sleeps."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit_handler.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(rate_limit_handler.time, "sleep", clock.sleep)
+    return clock
+
+
+def _max_in_window(times, amounts, window):
+    return max(
+        sum(a for t, a in zip(times, amounts) if start <= t < start + window)
+        for start in times
+    )
+
+
+def test_admits_up_to_the_limit_without_waiting(clock):
+    window = SlidingWindow(5, window=60)
+    for _ in range(5):
+        window.acquire()
+    assert clock.now == 1000.0
+
+
+def test_waits_for_the_oldest_admission_to_leave_the_window(clock):
+    window = SlidingWindow(5, window=60)
+    for _ in range(5):
+        window.acquire()
+        clock.now += 1
+
+    window.acquire()
+
+    # The first admission, at 1000, leaves the window at 1060
+    assert clock.now == pytest.approx(1060.0)
+
+
+def test_never_admits_more_than_the_limit_in_any_window(clock):
+    window = SlidingWindow(15, window=60)
+    times = []
+    for _ in range(100):
+        window.acquire()
+        times.append(clock.now)
+
+    assert _max_in_window(times, [1] * len(times), 60) == 15
+    # Starting from an empty window there is no extra burst on top of it
+    assert times[-1] - times[0] >= (100 // 15 - 1) * 60
+
+
+def test_token_amounts_are_bounded_by_the_limit(clock):
+    window = SlidingWindow(1000, window=60)
+    times = []
+    amounts = [300, 500, 200, 400, 700, 100, 900, 600]
+    for amount in amounts:
+        window.acquire(amount)
+        times.append(clock.now)
+
+    assert _max_in_window(times, amounts, 60) <= 1000
+
+
+def test_amount_over_the_limit_waits_for_an_empty_window(clock):
+    window = SlidingWindow(100, window=60)
+    window.acquire(10)
+
+    window.acquire(250)
+
+    assert clock.now == pytest.approx(1060.0)
+
+
+def test_drain_fills_the_rest_of_the_window(clock):
+    window = SlidingWindow(10, window=60)
+    window.acquire()
+    clock.now += 30
+    window.drain()
+
+    # Only the admission made before the drain frees room at 1060
+    window.acquire()
+    assert clock.now == pytest.approx(1060.0)
+    window.acquire()
+    assert clock.now == pytest.approx(1090.0)
+
+
+def test_rate_limiter_stays_within_requests_per_minute(clock):
+    limiter = RateLimiter("test", requests_per_minute=3, max_concurrency=8)
+    sent = []
+    for _ in range(7):
+        limiter.call(lambda: sent.append(clock.now))
+
+    assert sent[:3] == [1000.0] * 3
+    assert _max_in_window(sent, [1] * len(sent), 60) == 3
+    assert limiter.requests == 7
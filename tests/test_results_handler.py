@@ -0,0 +1,83 @@
+import json
+
+from results_handler import ResultStore
+from utils_handler import make_base_id
+
+
+def _analysis(latitude, country="Testland", score="High"):
+    return {
+        "base_info": {"latitude": latitude, "longitude": 10.0, "country": country},
+        "Commander": {"confidence_score": score, "overall_assessment": "ok"},
+    }
+
+
+def _store(tmp_path):
+    return ResultStore(
+        str(tmp_path / "data.jsonl"), snapshot_path=str(tmp_path / "data.json")
+    )
+
+
+def test_repair_drops_truncated_last_line(tmp_path):
+    store = _store(tmp_path)
+    store.append(_analysis(1.0))
+    store.append(_analysis(2.0))
+    with open(store.path, "a") as f:
+        f.write('{"base_info": {"latitude": 3.0')
+
+    repaired = _store(tmp_path)
+
+    assert [a["base_info"]["latitude"] for a in repaired] == [1.0, 2.0]
+    with open(repaired.path) as f:
+        assert f.read().endswith("\n")
+
+
+def test_repair_keeps_complete_journal(tmp_path):
+    store = _store(tmp_path)
+    store.append(_analysis(1.0))
+    with open(store.path) as f:
+        before = f.read()
+
+    _store(tmp_path)
+
+    with open(store.path) as f:
+        assert f.read() == before
+
+
+def test_load_all_keeps_latest_analysis_per_base(tmp_path):
+    store = _store(tmp_path)
+    store.append(_analysis(1.0, score="Low"))
+    store.append(_analysis(2.0))
+    store.append(_analysis(1.0, score="High"))
+
+    analyses = store.load_all()
+
+    assert [a["base_info"]["latitude"] for a in analyses] == [2.0, 1.0]
+    assert analyses[1]["Commander"]["confidence_score"] == "High"
+
+
+def test_compact_rewrites_journal_and_publishes_snapshot(tmp_path):
+    store = _store(tmp_path)
+    store.append(_analysis(1.0, score="Low"))
+    store.append(_analysis(1.0, score="High"))
+    store.append(_analysis(2.0))
+
+    store.compact()
+
+    with open(store.path) as f:
+        journal = [json.loads(line) for line in f]
+    with open(store.snapshot_path) as f:
+        snapshot = json.load(f)
+    assert journal == snapshot == store.load_all()
+    assert len(snapshot) == 2
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_imports_existing_snapshot(tmp_path):
+    analyses = [_analysis(1.0), _analysis(2.0)]
+    with open(tmp_path / "data.json", "w") as f:
+        json.dump(analyses, f)
+
+    store = _store(tmp_path)
+
+    assert store.load_all() == analyses
+    assert store.analyzed_ids() == {make_base_id(a["base_info"]) for a in analyses}
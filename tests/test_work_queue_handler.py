@@ -0,0 +1,124 @@
+import pytest
+
+import work_queue_handler
+from work_queue_handler import DONE, FAILED, LEASED, PENDING, WorkQueue
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(work_queue_handler.time, "time", clock.time)
+    return clock
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    queues = []
+
+    def make_queue(**kwargs):
+        queue = WorkQueue(str(tmp_path / "queue.db"), lease_seconds=60, **kwargs)
+        queues.append(queue)
+        return queue
+
+    yield make_queue
+    for queue in queues:
+        queue.close()
+
+
+def _base(latitude):
+    return {"latitude": latitude, "longitude": 10.0, "country": "Testland"}
+
+
+def _status(queue, base):
+    return (
+        queue._connection()
+        .execute(
+            "SELECT status, attempts FROM bases WHERE base_id = ?",
+            (work_queue_handler.make_base_id(base),),
+        )
+        .fetchone()
+    )
+
+
+def test_add_skips_queued_bases(make_queue):
+    queue = make_queue()
+    assert queue.add([_base(1.0), _base(2.0)]) == 2
+    assert queue.add([_base(2.0), _base(3.0)]) == 1
+    assert queue.counts() == {PENDING: 3}
+
+
+def test_claims_bases_in_order_once(clock, make_queue):
+    queue = make_queue()
+    queue.add([_base(1.0), _base(2.0)])
+
+    assert queue.claim() == _base(1.0)
+    assert queue.claim() == _base(2.0)
+    assert queue.claim() is None
+    assert queue.counts() == {LEASED: 2}
+
+
+def test_expired_lease_is_reclaimed(clock, make_queue):
+    queue = make_queue()
+    other = make_queue()
+    other.worker_id = "other-host:1"
+    queue.add([_base(1.0)])
+    assert queue.claim() == _base(1.0)
+
+    assert other.claim() is None
+    clock.now += 61
+    assert other.claim() == _base(1.0)
+
+    # The first worker lost its lease and can no longer renew or finish it
+    assert queue.heartbeat(work_queue_handler.make_base_id(_base(1.0))) is False
+    other.complete(work_queue_handler.make_base_id(_base(1.0)))
+    assert queue.counts() == {DONE: 1}
+
+
+def test_heartbeat_keeps_the_lease(clock, make_queue):
+    queue = make_queue()
+    other = make_queue()
+    other.worker_id = "other-host:1"
+    queue.add([_base(1.0)])
+    queue.claim()
+
+    clock.now += 50
+    assert queue.heartbeat(work_queue_handler.make_base_id(_base(1.0))) is True
+    clock.now += 50
+
+    assert other.claim() is None
+
+
+def test_expired_leases_fail_after_max_attempts(clock, make_queue):
+    queue = make_queue(max_attempts=2)
+    queue.add([_base(1.0)])
+
+    for _ in range(2):
+        assert queue.claim() == _base(1.0)
+        clock.now += 61
+
+    assert queue.claim() is None
+    assert queue.counts() == {FAILED: 1}
+    assert _status(queue, _base(1.0)) == (FAILED, 2)
+
+
+def test_released_base_is_retried_until_max_attempts(clock, make_queue):
+    queue = make_queue(max_attempts=2)
+    base_id = work_queue_handler.make_base_id(_base(1.0))
+    queue.add([_base(1.0)])
+
+    queue.claim()
+    queue.release(base_id, error="boom")
+    assert queue.counts() == {PENDING: 1}
+
+    queue.claim()
+    queue.release(base_id, error="boom")
+    assert queue.counts() == {FAILED: 1}
+    assert queue.claim() is None
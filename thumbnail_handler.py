@@ -0,0 +1,127 @@
+"""
+Small and medium WebP previews of the captured screenshots.
+
+Every screenshot ./screenshots/{base_id}/{name}.jpeg gets its previews at
+./screenshots/{base_id}/thumbnails/{name}_{size}.webp, so the dashboard can
+show a light image and open the full frame only on demand.
+
+Usage:
+    python thumbnail_handler.py --root ./screenshots --workers 8
+"""
+
+import argparse
+import glob
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from PIL import Image
+
+SMALL = "small"
+MEDIUM = "medium"
+
+# Longest side of each preview in pixels
+THUMBNAIL_SIZES = {SMALL: 256, MEDIUM: 512}
+THUMBNAIL_QUALITY = 80
+
+
+def thumbnail_path(image_path: str, size: str) -> str:
+    """Return where the `size` preview of a screenshot is stored."""
+    directory, filename = os.path.split(image_path)
+    name = os.path.splitext(filename)[0]
+    return os.path.join(directory, "thumbnails", f"{name}_{size}.webp")
+
+
+def write_thumbnails(image_path: str, jpeg_data: bytes = None) -> list:
+    """
+    Write every preview size of a screenshot.
+
+    Args:
+        image_path: Path of the full-size screenshot
+        jpeg_data: The encoded screenshot, to avoid reading it back from disk
+
+    Returns:
+        list: Paths of the written previews
+    """
+    if jpeg_data is None:
+        with open(image_path, "rb") as f:
+            jpeg_data = f.read()
+    image = Image.open(BytesIO(jpeg_data))
+    # Decode at a reduced scale straight away; the previews are much smaller
+    image.draft("RGB", (max(THUMBNAIL_SIZES.values()),) * 2)
+    image = image.convert("RGB")
+
+    written = []
+    # Largest first, so each preview is resized from the previous one
+    for size, pixels in sorted(
+        THUMBNAIL_SIZES.items(), key=lambda item: item[1], reverse=True
+    ):
+        image.thumbnail((pixels, pixels), Image.Resampling.LANCZOS)
+        path = thumbnail_path(image_path, size)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique per writer thread, as several threads may write one preview
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        image.save(temp_path, "WEBP", quality=THUMBNAIL_QUALITY, method=4)
+        os.replace(temp_path, path)
+        written.append(path)
+    return written
+
+
+def _needs_thumbnails(image_path: str) -> bool:
+    image_mtime = os.path.getmtime(image_path)
+    for size in THUMBNAIL_SIZES:
+        path = thumbnail_path(image_path, size)
+        if not os.path.exists(path) or os.path.getmtime(path) < image_mtime:
+            return True
+    return False
+
+
+def _backfill_one(image_path: str):
+    try:
+        write_thumbnails(image_path)
+        return None
+    except Exception as e:
+        return f"{image_path}: {e}"
+
+
+def backfill(root: str = "./screenshots", workers: int = None, force: bool = False):
+    """
+    Generate missing or outdated previews for existing screenshots in parallel.
+
+    Args:
+        root: Directory holding one screenshot directory per base
+        workers: Number of worker processes. Defaults to the number of CPUs.
+        force: Regenerate previews that are already up to date
+
+    Returns:
+        int: Number of screenshots whose previews were written
+    """
+    image_paths = sorted(glob.glob(os.path.join(root, "*", "*.jpeg")))
+    if not force:
+        image_paths = [path for path in image_paths if _needs_thumbnails(path)]
+    print(f"Generating thumbnails for {len(image_paths)} screenshots")
+
+    written = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for error in executor.map(_backfill_one, image_paths, chunksize=16):
+            if error is None:
+                written += 1
+            else:
+                print(f"Error generating thumbnails for {error}")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--root", default="./screenshots")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    written = backfill(root=args.root, workers=args.workers, force=args.force)
+    print(f"Wrote thumbnails for {written} screenshots")
+
+
+if __name__ == "__main__":
+    main()
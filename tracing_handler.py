@@ -0,0 +1,197 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+
+class Tracer:
+    """
+    Records timing spans for the stages of the analysis pipeline.
+
+    Each span is written as one JSON line (name, start time, duration and tags)
+    to `path` and aggregated in memory for the end-of-run summary. Tags set with
+    `context` on the current thread, such as the base id and analyst index, are
+    attached to every span opened inside it. When `opentelemetry` is installed
+    and enabled, spans are also forwarded to the globally configured
+    OpenTelemetry tracer, so any OTLP exporter can receive them.
+
+    Attributes:
+        path: JSONL file receiving the spans, or None to only aggregate.
+        durations: Span durations in seconds, keyed by span name.
+        started_at: Wall-clock start of the run, used by the summary.
+    """
+
+    def __init__(self, path: str = None, opentelemetry: bool = False):
+        self.path = path
+        self.durations = {}
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._file = None
+        self._otel_tracer = None
+
+        if path is not None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(path, "a")
+        if opentelemetry:
+            if otel_trace is None:
+                raise RuntimeError(
+                    "OpenTelemetry export requires opentelemetry-api "
+                    "(pip install opentelemetry-sdk)."
+                )
+            self._otel_tracer = otel_trace.get_tracer("osint-analyzer")
+
+    def _tags(self) -> dict:
+        return getattr(self._local, "tags", {})
+
+    @contextmanager
+    def context(self, **tags):
+        """Attach tags to every span opened on this thread inside the block."""
+        previous = self._tags()
+        self._local.tags = {**previous, **tags}
+        try:
+            yield
+        finally:
+            self._local.tags = previous
+
+    @contextmanager
+    def span(self, name: str, **tags):
+        """Time the enclosed block as a span called `name`."""
+        start = time.time()
+        start_counter = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start_counter
+            self.record(name, start, duration, **tags)
+
+    def record(self, name: str, start: float, duration: float, **tags):
+        """
+        Record a span measured by the caller.
+
+        Args:
+            name: Span name
+            start: Wall-clock start time in seconds since the epoch
+            duration: Span duration in seconds
+            tags: Extra tags, added to the current thread's context tags
+        """
+        tags = {**self._tags(), **tags}
+        line = json.dumps(
+            {
+                "name": name,
+                "start": start,
+                "duration_ms": round(duration * 1000, 3),
+                "attributes": tags,
+            },
+            default=str,
+        )
+        with self._lock:
+            self.durations.setdefault(name, []).append(duration)
+            if self._file is not None:
+                self._file.write(line + "\n")
+
+        if self._otel_tracer is not None:
+            start_ns = int(start * 1e9)
+            otel_span = self._otel_tracer.start_span(
+                name,
+                start_time=start_ns,
+                attributes={key: str(value) for key, value in tags.items()},
+            )
+            otel_span.end(end_time=start_ns + int(duration * 1e9))
+
+    def summary(self) -> list:
+        """
+        Aggregate the recorded spans.
+
+        Returns:
+            list: One dict per span name, sorted by total time, with the span
+                count, total seconds, mean and p95 milliseconds and the share
+                of the run's wall-clock time.
+        """
+        wall_clock = max(time.time() - self.started_at, 1e-9)
+        with self._lock:
+            durations = {name: sorted(d) for name, d in self.durations.items()}
+
+        rows = []
+        for name, samples in durations.items():
+            total = sum(samples)
+            p95 = samples[min(len(samples) - 1, len(samples) * 95 // 100)]
+            rows.append(
+                {
+                    "name": name,
+                    "count": len(samples),
+                    "total_s": total,
+                    "mean_ms": total / len(samples) * 1000,
+                    "p95_ms": p95 * 1000,
+                    "wall_clock_pct": total / wall_clock * 100,
+                }
+            )
+        return sorted(rows, key=lambda row: row["total_s"], reverse=True)
+
+    def print_summary(self):
+        """Print where the run's time went, one line per span name."""
+        rows = self.summary()
+        if not rows:
+            return
+
+        # Concurrent workers overlap, so shares can add up to more than 100%
+        print(f"Time breakdown over {time.time() - self.started_at:.1f}s wall-clock:")
+        for row in rows:
+            print(
+                f"  {row['name']:<24} n={row['count']:<6} "
+                f"total={row['total_s']:8.2f}s mean={row['mean_ms']:9.1f}ms "
+                f"p95={row['p95_ms']:9.1f}ms {row['wall_clock_pct']:6.1f}%"
+            )
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_tracer = Tracer()
+
+
+def configure_tracing(path: str = None, opentelemetry: bool = False) -> Tracer:
+    """
+    Replace the global tracer, starting a new run.
+
+    Args:
+        path: JSONL file to write spans to, or None to only aggregate them
+        opentelemetry: Also forward spans to the OpenTelemetry tracer
+
+    Returns:
+        Tracer: The new global tracer
+    """
+    global _tracer
+    _tracer.close()
+    _tracer = Tracer(path=path, opentelemetry=opentelemetry)
+    return _tracer
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def span(name: str, **tags):
+    """Time a block as a span on the global tracer."""
+    return _tracer.span(name, **tags)
+
+
+def record_span(name: str, start: float, duration: float, **tags):
+    """Record a span measured by the caller on the global tracer."""
+    _tracer.record(name, start, duration, **tags)
+
+
+def trace_context(**tags):
+    """Tag every span opened on this thread inside the block."""
+    return _tracer.context(**tags)
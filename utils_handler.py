@@ -21,3 +21,46 @@ def parse_csv(filename: str, rows_to_parse: int) -> list:
     except Exception as e:
         print(f"Error parsing CSV: {e}")
         return []
+
+
+def make_base_id(base: dict) -> str:
+    """
+    Build the identifier used for a base in results and screenshot paths.
+    The identifier has the form latitude_longitude_country.
+    """
+    return f"{base.get('latitude', '')}_{base.get('longitude', '')}_{base.get('country', '')}"
+
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(latitude: float, longitude: float, precision: int = 9) -> str:
+    """
+    Encode a coordinate as a geohash.
+
+    Nearby points share a prefix, so a geohash column sorts bases into map
+    cells that can be selected with a range query. Nine characters locate a
+    point to within about five meters.
+    """
+    bounds = [[-90.0, 90.0], [-180.0, 180.0]]
+    value = [float(latitude), float(longitude)]
+    code = []
+    bits = 0
+    bit_count = 0
+    is_longitude = True
+    while len(code) < precision:
+        low, high = bounds[is_longitude]
+        middle = (low + high) / 2
+        bits <<= 1
+        if value[is_longitude] >= middle:
+            bits |= 1
+            bounds[is_longitude][0] = middle
+        else:
+            bounds[is_longitude][1] = middle
+        is_longitude = not is_longitude
+        bit_count += 1
+        if bit_count == 5:
+            code.append(_GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(code)
@@ -0,0 +1,226 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from utils_handler import make_base_id
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class WorkQueue:
+    """
+    SQLite lease table that lets several analyzer processes split the bases.
+
+    Every base is one row. A worker claims the oldest pending base, or one
+    whose lease has expired, by taking a lease for `lease_seconds`. While the
+    base is being analyzed a background thread renews the leases this process
+    holds, so a crashed or killed worker only delays its bases until their
+    leases expire. A failed base goes back to the queue, and a base that failed
+    or whose lease expired is marked failed after `max_attempts` claims. Claims run in an IMMEDIATE transaction, so
+    two workers never get the same base, whether they are threads, processes
+    or hosts sharing the database file. The database uses SQLite's default
+    rollback journal rather than WAL, which does not work on network
+    filesystems.
+
+    Attributes:
+        path: Path of the SQLite database.
+        lease_seconds: How long a claim stays valid without a heartbeat.
+        max_attempts: Claims after which a failing base is given up on.
+        worker_id: Owner recorded on this process's leases.
+    """
+
+    def __init__(
+        self,
+        path: str = "work_queue.db",
+        lease_seconds: float = 600,
+        max_attempts: int = 3,
+    ):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._local = threading.local()
+        self._held = set()
+        self._held_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+        with self._connection() as connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS bases (
+                    base_id TEXT PRIMARY KEY,
+                    base TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    owner TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    updated_at REAL
+                )
+                """
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS bases_status ON bases (status)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # SQLite connections may not be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=60)
+            self._local.connection = connection
+        return connection
+
+    def add(self, bases: list) -> int:
+        """
+        Queue bases that are not in the queue yet.
+
+        Returns:
+            int: Number of bases added
+        """
+        now = time.time()
+        with self._connection() as connection:
+            cursor = connection.executemany(
+                "INSERT OR IGNORE INTO bases (base_id, base, status, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(make_base_id(b), json.dumps(b), PENDING, now) for b in bases],
+            )
+            return cursor.rowcount
+
+    def claim(self):
+        """
+        Lease the next available base to this process.
+
+        Returns:
+            dict: The claimed base, or None when no base is available
+        """
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            # A base whose every claim ended in an expired lease, e.g. one
+            # that crashes the worker, is given up on instead of reclaimed
+            connection.execute(
+                "UPDATE bases SET status = ?, lease_expires = NULL, "
+                "error = COALESCE(error, ?), updated_at = ? "
+                "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, "Lease expired", now, LEASED, now, self.max_attempts),
+            )
+            row = connection.execute(
+                "SELECT base_id, base FROM bases "
+                "WHERE status = ? OR (status = ? AND lease_expires < ?) "
+                "ORDER BY rowid LIMIT 1",
+                (PENDING, LEASED, now),
+            ).fetchone()
+            if row is None:
+                connection.commit()
+                return None
+
+            base_id, base = row
+            connection.execute(
+                "UPDATE bases SET status = ?, owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE base_id = ?",
+                (LEASED, self.worker_id, now + self.lease_seconds, now, base_id),
+            )
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+
+        with self._held_lock:
+            self._held.add(base_id)
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._renew, daemon=True)
+                self._heartbeat.start()
+        return json.loads(base)
+
+    def _renew(self):
+        """Extend every lease this process holds until `close` is called."""
+        while not self._stop.wait(self.lease_seconds / 3):
+            with self._held_lock:
+                held = list(self._held)
+            for base_id in held:
+                try:
+                    self.heartbeat(base_id)
+                except sqlite3.Error as e:
+                    print(f"Lease heartbeat failed for base {base_id}: {e}")
+
+    def heartbeat(self, base_id: str) -> bool:
+        """
+        Extend this process's lease on a base.
+
+        Returns:
+            bool: False if the lease was lost to another worker
+        """
+        now = time.time()
+        with self._connection() as connection:
+            cursor = connection.execute(
+                "UPDATE bases SET lease_expires = ?, updated_at = ? "
+                "WHERE base_id = ? AND status = ? AND owner = ?",
+                (now + self.lease_seconds, now, base_id, LEASED, self.worker_id),
+            )
+        if cursor.rowcount == 0:
+            print(f"Lost the lease on base {base_id}")
+            return False
+        return True
+
+    def complete(self, base_id: str):
+        """Mark a claimed base as analyzed."""
+        self._finish(base_id, DONE, None)
+
+    def release(self, base_id: str, error: str = None):
+        """
+        Give a claimed base back after a failure.
+
+        The base is retried by the next claim, or marked failed once it has
+        been claimed `max_attempts` times.
+        """
+        self._finish(base_id, PENDING, error)
+
+    def _finish(self, base_id: str, status: str, error):
+        with self._held_lock:
+            self._held.discard(base_id)
+        now = time.time()
+        with self._connection() as connection:
+            if status == PENDING:
+                connection.execute(
+                    "UPDATE bases SET status = CASE WHEN attempts >= ? THEN ? "
+                    "ELSE ? END WHERE base_id = ? AND owner = ?",
+                    (self.max_attempts, FAILED, PENDING, base_id, self.worker_id),
+                )
+            else:
+                connection.execute(
+                    "UPDATE bases SET status = ? WHERE base_id = ? AND owner = ?",
+                    (status, base_id, self.worker_id),
+                )
+            connection.execute(
+                "UPDATE bases SET lease_expires = NULL, error = ?, updated_at = ? "
+                "WHERE base_id = ? AND owner = ?",
+                (error, now, base_id, self.worker_id),
+            )
+
+    def counts(self) -> dict:
+        """Return the number of bases in each status."""
+        rows = (
+            self._connection()
+            .execute("SELECT status, COUNT(*) FROM bases GROUP BY status")
+            .fetchall()
+        )
+        return dict(rows)
+
+    def close(self):
+        """Stop the heartbeat and close this thread's connection."""
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None